@@ -0,0 +1,69 @@
+"""Compare two runs of ``benchmarks.suite``.
+
+Run with ``python -m benchmarks.compare before.json after.json``.
+
+Cases are matched by backend, size, operation, variant and concurrency.
+The ratio of the ``after`` to the ``before`` p50 latency is printed for
+each, and the exit status is 1 when one got slower than ``--threshold``.
+"""
+import argparse
+import json
+import sys
+
+KEY = ("backend", "size", "operation", "variant", "concurrency")
+
+
+def load(path):
+    with open(path) as source:
+        results = json.load(source)["results"]
+    return {tuple(result[name] for name in KEY): result for result in results}
+
+
+def compare(before, after, metric="p50_ms", threshold=0.1):
+    """Yield ``(key, before, after, ratio, regressed)`` of the cases of both
+    runs, a ratio over ``1 + threshold`` is a regression."""
+    for key in sorted(set(before) & set(after), key=str):
+        old, new = before[key][metric], after[key][metric]
+        ratio = new / old if old else float("inf")
+        yield key, old, new, ratio, ratio > 1 + threshold
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--metric",
+        default="p50_ms",
+        choices=("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"),
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown ratio tolerated, 0.1 is 10%%.",
+    )
+    args = parser.parse_args(argv)
+
+    regressions = compared = 0
+    for key, old, new, ratio, regressed in compare(
+        load(args.before), load(args.after), args.metric, args.threshold
+    ):
+        regressions += regressed
+        compared += 1
+        print(
+            "{:<10} {:>9} {:<8} {:<16} c={:<3} {:9.3f} -> {:9.3f} ms "
+            "{:6.2f}x{}".format(
+                *key, old, new, ratio, "  REGRESSION" if regressed else ""
+            )
+        )
+
+    if not compared:
+        print("No case in common.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Per row cost of each result mode.
+
+Run with ``python -m benchmarks.result_modes``.
+
+The SQLAlchemy repository is measured end to end on an in-memory SQLite
+database. The Motor repository is measured on the conversion of already
+fetched documents only, no server is needed.
+"""
+import asyncio
+import time
+from typing import Optional
+from uuid import UUID, uuid4
+
+from bson import ObjectId
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import Field as SQLField
+from sqlmodel import SQLModel
+
+from service_repository.repositories.motor import BaseRepositoryMotor
+from service_repository.repositories.sqlalchemy import BaseRepositorySqlalchemy
+from service_repository.results import RESULT_MODES
+
+ROWS = 5000
+REPEAT = 5
+
+
+class BenchBase(SQLModel):
+    title: str
+    artist: str
+    album: str
+    genre: str
+    year: int
+    plays: int
+    is_active: bool = True
+
+
+class BenchSong(BenchBase, table=True):
+    id: UUID = SQLField(default_factory=uuid4, primary_key=True)
+
+
+class BenchSongRead(BenchBase):
+    id: UUID
+
+
+class BenchSongRepository(BaseRepositorySqlalchemy):
+    model = BenchSong
+    schema = BenchSongRead
+    max_per_page = ROWS
+
+
+class BenchProduct(BaseModel):
+    id: Optional[ObjectId] = Field(alias="_id")
+    title: str
+    artist: str
+    album: str
+    genre: str
+    year: int
+    plays: int
+    is_active: bool = True
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class BenchProductRepository(BaseRepositoryMotor):
+    model = BenchProduct
+    collection = "bench_product"
+
+
+def row(index):
+    return {
+        "title": "Title {}".format(index),
+        "artist": "Artist {}".format(index % 50),
+        "album": "Album {}".format(index % 200),
+        "genre": "Genre {}".format(index % 10),
+        "year": 1970 + index % 50,
+        "plays": index,
+    }
+
+
+async def bench_sqlalchemy():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async_session = sessionmaker(
+        bind=engine, expire_on_commit=False, class_=AsyncSession
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    async with async_session() as session:
+        await BenchSongRepository(db=session).bulk_create(
+            [row(index) for index in range(ROWS)]
+        )
+
+    results = {}
+    for result_mode in RESULT_MODES:
+        best = None
+        for _ in range(REPEAT):
+            # A new session each time, so the identity map starts empty.
+            async with async_session() as session:
+                repository = BenchSongRepository(db=session)
+                start = time.perf_counter()
+                await repository.paginate(
+                    per_page=ROWS, count_mode="none", result_mode=result_mode
+                )
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[result_mode] = best / ROWS
+
+    await engine.dispose()
+    return results
+
+
+def bench_motor():
+    documents = [dict(row(index), _id=ObjectId()) for index in range(ROWS)]
+    repository = BenchProductRepository(db=None)
+
+    results = {}
+    for result_mode in RESULT_MODES:
+        best = None
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            repository._to_results(documents, result_mode)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[result_mode] = best / ROWS
+    return results
+
+
+def report(name, results):
+    baseline = results["model"]
+    print(name)
+    for result_mode, per_row in results.items():
+        print(
+            "  {:<10} {:8.2f} us/row {:6.2f}x".format(
+                result_mode, per_row * 1e6, baseline / per_row
+            )
+        )
+
+
+def main():
+    report("sqlalchemy paginate", asyncio.run(bench_sqlalchemy()))
+    report("motor documents to results", bench_motor())
+
+
+if __name__ == "__main__":
+    main()
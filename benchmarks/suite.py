@@ -0,0 +1,366 @@
+"""Latency and throughput of the operations of ``BaseService``.
+
+Run with ``python -m benchmarks.suite``, for example::
+
+    python -m benchmarks.suite --backend sqlalchemy motor \\
+        --sizes 1000 100000 --concurrency 1 8 --output before.json
+
+The SQLAlchemy backend runs the ``Song`` service of the tests on a temporary
+SQLite database, or on ``--database-url``. The Motor backend runs the
+``Product`` service on ``mongomock-motor``, an in-process stand-in, or on a
+server with ``--mongo-url``.
+
+Every operation is measured at each table size and concurrency level, with
+the filter complexities ``none``, ``simple`` and ``complex`` for ``count``,
+``all`` and ``paginate`` and the first, middle and last page for
+``paginate``. The results are printed and, with ``--output``, written as
+JSON to compare runs with ``python -m benchmarks.compare``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from tests.product.models import ProductCreate, ProductUpdate
+from tests.product.repositories import ProductRepository
+from tests.product.services import ProductService
+from tests.song.models import SongCreate, SongUpdate
+from tests.song.repositories import SongRepository
+from tests.song.services import SongService
+
+SEED_BATCH = 10000
+PER_PAGE = 20
+ALL_LIMIT = 100
+
+FILTERS = {
+    "none": {},
+    "simple": [{"field": "is_active", "op": "==", "value": True}],
+    "complex": {
+        "or": [
+            {
+                "and": [
+                    {"field": "title", "op": "like", "value": "Title 1%"},
+                    {"field": "is_active", "op": "==", "value": True},
+                ]
+            },
+            {
+                "field": "title",
+                "op": "in",
+                "value": ["Title {}".format(index) for index in range(10)],
+            },
+        ]
+    },
+}
+
+
+def row(index):
+    return {"title": "Title {}".format(index), "is_active": index % 2 == 0}
+
+
+def percentile(values, percent):
+    """Return the `percent` percentile of the sorted `values`."""
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "iterations": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1e3,
+        "p50_ms": percentile(latencies, 50) * 1e3,
+        "p90_ms": percentile(latencies, 90) * 1e3,
+        "p99_ms": percentile(latencies, 99) * 1e3,
+        "max_ms": latencies[-1] * 1e3,
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+async def measure(operation, iterations, concurrency):
+    """Await ``operation(index)`` `iterations` times split over
+    `concurrency` workers, returning the latency percentiles and the
+    throughput in operations per second."""
+    latencies = []
+    indexes = iter(range(iterations))
+
+    async def worker():
+        for index in indexes:
+            start = time.perf_counter()
+            await operation(index)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - start)
+
+
+class SqlalchemyBackend(object):
+    """The ``Song`` service on SQLAlchemy, a session per operation."""
+
+    name = "sqlalchemy"
+    key = "id"
+    create_schema = SongCreate
+    update_schema = SongUpdate
+
+    def __init__(self, database_url=None):
+        self.database_url = database_url
+        self.path = None
+
+    async def setup(self):
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlmodel import SQLModel
+
+        self.metadata = SQLModel.metadata
+        database_url = self.database_url
+        if database_url is None:
+            fd, self.path = tempfile.mkstemp(suffix=".db")
+            os.close(fd)
+            database_url = "sqlite+aiosqlite:///{}".format(self.path)
+
+        self.engine = create_async_engine(database_url)
+        self.sessionmaker = sessionmaker(
+            bind=self.engine, expire_on_commit=False, class_=AsyncSession
+        )
+
+    async def teardown(self):
+        await self.engine.dispose()
+        if self.path is not None:
+            os.remove(self.path)
+
+    async def reset(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self.metadata.drop_all)
+            await conn.run_sync(self.metadata.create_all)
+
+    async def insert(self, rows):
+        async with self.sessionmaker() as session:
+            result = await SongRepository(db=session).bulk_create(rows)
+        return [song.id for song in result["items"]]
+
+    @asynccontextmanager
+    async def service(self):
+        async with self.sessionmaker() as session:
+            yield SongService(db=session)
+
+
+class MotorBackend(object):
+    """The ``Product`` service on Motor, or on ``mongomock-motor``."""
+
+    name = "motor"
+    key = "_id"
+    create_schema = ProductCreate
+    update_schema = ProductUpdate
+
+    def __init__(self, mongo_url=None):
+        self.mongo_url = mongo_url
+
+    async def setup(self):
+        if self.mongo_url is None:
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                raise SystemExit(
+                    "Install mongomock-motor or give --mongo-url to run the "
+                    "motor backend."
+                )
+            self.client = AsyncMongoMockClient()
+        else:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self.client = AsyncIOMotorClient(self.mongo_url)
+        self.db = self.client.get_database("benchmarks")
+
+    async def teardown(self):
+        await self.client.drop_database("benchmarks")
+
+    async def reset(self):
+        await self.db.drop_collection(ProductRepository.collection)
+
+    async def insert(self, rows):
+        result = await ProductRepository(db=self.db).bulk_create(rows)
+        return [product.id for product in result["items"]]
+
+    @asynccontextmanager
+    async def service(self):
+        yield ProductService(db=self.db)
+
+
+def operations(backend, size, ids, extra_ids):
+    """Yield the ``(operation, variant, coroutine function)`` to measure,
+    the rows in `extra_ids` are the ones deleted."""
+    key = backend.key
+
+    async def create(index):
+        async with backend.service() as service:
+            await service.create(
+                schema_in=backend.create_schema(**row(size + index))
+            )
+
+    async def get(index):
+        async with backend.service() as service:
+            await service.get(**{key: ids[index % len(ids)]})
+
+    async def update(index):
+        async with backend.service() as service:
+            instance = await service.get(**{key: ids[index % len(ids)]})
+            await service.update(
+                instance=instance,
+                schema_in=backend.update_schema(is_active=index % 2 == 0),
+            )
+
+    async def delete(index):
+        async with backend.service() as service:
+            await service.delete(**{key: extra_ids[index]})
+
+    yield "create", "", create
+    yield "get", "", get
+    yield "update", "get+update", update
+    yield "delete", "", delete
+
+    for complexity, criteria in FILTERS.items():
+
+        async def count(index, criteria=criteria):
+            async with backend.service() as service:
+                await service.count(criteria=criteria)
+
+        async def all_(index, criteria=criteria):
+            async with backend.service() as service:
+                await service.all(criteria=criteria, limit=ALL_LIMIT)
+
+        yield "count", complexity, count
+        yield "all", complexity, all_
+
+    last_page = max(1, -(-size // PER_PAGE))
+    for depth, page in (
+        ("first", 1),
+        ("middle", max(1, last_page // 2)),
+        ("last", last_page),
+    ):
+        for complexity, criteria in FILTERS.items():
+            if depth != "first" and complexity != "none":
+                continue
+
+            async def paginate(index, page=page, criteria=criteria):
+                async with backend.service() as service:
+                    await service.paginate(
+                        page=page, per_page=PER_PAGE, criteria=criteria
+                    )
+
+            yield "paginate", "{}/{}".format(depth, complexity), paginate
+
+
+async def run_backend(backend, sizes, concurrencies, iterations):
+    results = []
+    await backend.setup()
+    try:
+        for size in sizes:
+            await backend.reset()
+            ids = []
+            for start in range(0, size, SEED_BATCH):
+                stop = min(size, start + SEED_BATCH)
+                ids += await backend.insert(
+                    [row(index) for index in range(start, stop)]
+                )
+
+            for concurrency in concurrencies:
+                # The creates of each level add `iterations` rows, a small
+                # drift next to the sizes measured.
+                extra_ids = await backend.insert(
+                    [row(-index - 1) for index in range(iterations)]
+                )
+
+                for name, variant, operation in operations(
+                    backend, size, ids, extra_ids
+                ):
+                    stats = await measure(operation, iterations, concurrency)
+                    result = {
+                        "backend": backend.name,
+                        "size": size,
+                        "operation": name,
+                        "variant": variant,
+                        "concurrency": concurrency,
+                        **stats,
+                    }
+                    report(result)
+                    results.append(result)
+    finally:
+        await backend.teardown()
+    return results
+
+
+def report(result):
+    print(
+        "{backend:<10} {size:>9} {operation:<8} {variant:<16} "
+        "c={concurrency:<3} p50={p50_ms:8.3f}ms p99={p99_ms:8.3f}ms "
+        "{throughput:10.1f} ops/s".format(**result),
+        flush=True,
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.suite", description=__doc__.split("\n")[0]
+    )
+    parser.add_argument(
+        "--backend",
+        nargs="+",
+        choices=("sqlalchemy", "motor"),
+        default=["sqlalchemy", "motor"],
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8])
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=200,
+        help="Operations measured per case.",
+    )
+    parser.add_argument("--database-url", help="SQLAlchemy async URL.")
+    parser.add_argument("--mongo-url", help="MongoDB URL.")
+    parser.add_argument("--output", help="Write the results as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The index warnings of the unindexed filters would flood the report.
+    logging.basicConfig(level=logging.ERROR)
+    backends = {
+        "sqlalchemy": lambda: SqlalchemyBackend(args.database_url),
+        "motor": lambda: MotorBackend(args.mongo_url),
+    }
+
+    results = []
+    for name in args.backend:
+        results += asyncio.run(
+            run_backend(
+                backends[name](), args.sizes, args.concurrency, args.iterations
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(
+                {
+                    "meta": {
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "args": vars(args),
+                    },
+                    "results": results,
+                },
+                output,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
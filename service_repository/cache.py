@@ -0,0 +1,137 @@
+import json
+import time
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from uuid import uuid4
+
+MISSING = object()
+
+
+def make_key(*parts):
+    """Build a stable cache key from `parts`.
+
+    Dicts are serialized with sorted keys, so criteria built in a different
+    order share the same key. Values that are not JSON serializable, like
+    UUID or ObjectId, are serialized by their string representation.
+    """
+    return json.dumps(
+        parts, sort_keys=True, separators=(",", ":"), default=str
+    )
+
+
+class CacheBackend(metaclass=ABCMeta):
+    """Class representing the cache backend interface.
+
+    Implement it to plug a shared store, like Redis, serializing the
+    values as needed. The hit, miss and eviction counters are kept by the
+    backend, so they are shared by all the services using it.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    async def get(self, key, default=None):
+        """Get the value of `key` or `default` if missing or expired."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def set(self, key, value, ttl: float = None):
+        """Set the value of `key`, expiring after `ttl` seconds."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete(self, key):
+        """Remove `key` if present."""
+        raise NotImplementedError()
+
+    @property
+    def metrics(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with a time to live per entry."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    async def get(self, key, default=None):
+        """Get the value of `key` or `default` if missing or expired."""
+        try:
+            expires_at, value = self._data[key]
+        except KeyError:
+            return default
+
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl: float = None):
+        """Set the value of `key`, evicting the least recently used."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key):
+        """Remove `key` if present."""
+        self._data.pop(key, None)
+
+    async def clear(self):
+        """Remove all the entries."""
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+async def get_or_set(cache: CacheBackend, key, factory, ttl: float = None):
+    """Get `key` from `cache` or set it with the result of `factory()`."""
+    value = await cache.get(key, MISSING)
+    if value is not MISSING:
+        cache.hits += 1
+        return value
+
+    cache.misses += 1
+    value = await factory()
+    await cache.set(key, value, ttl=ttl)
+    return value
+
+
+async def generation_key(cache: CacheBackend, namespace, *parts):
+    """Build the key of `parts` in the current generation of `namespace`.
+
+    The generation is a random token, so a generation lost by eviction or
+    expiration never comes back and the entries of older generations are
+    never read again.
+    """
+    key = make_key("generation", namespace)
+    generation = await cache.get(key)
+    if generation is None:
+        generation = uuid4().hex
+        await cache.set(key, generation)
+    return make_key(namespace, generation, *parts)
+
+
+async def invalidate(cache: CacheBackend, namespace):
+    """Invalidate all the entries of `namespace` by starting a new
+    generation."""
+    await cache.set(make_key("generation", namespace), uuid4().hex)
@@ -0,0 +1,101 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from service_repository.exceptions import InvalidCursor
+
+try:
+    from bson import ObjectId
+except ImportError:  # pragma: no cover
+    ObjectId = None
+
+CURSOR_NEXT = "next"
+CURSOR_PREV = "prev"
+
+
+def _encode_value(value):
+    if isinstance(value, UUID):
+        return {"$uuid": str(value)}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if ObjectId is not None and isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if not isinstance(value, dict) or len(value) != 1:
+        return value
+
+    ((tag, raw),) = value.items()
+    if tag == "$uuid":
+        return UUID(raw)
+    if tag == "$datetime":
+        return datetime.fromisoformat(raw)
+    if tag == "$date":
+        return date.fromisoformat(raw)
+    if tag == "$time":
+        return time.fromisoformat(raw)
+    if tag == "$decimal":
+        return Decimal(raw)
+    if tag == "$oid" and ObjectId is not None:
+        return ObjectId(raw)
+    return value
+
+
+def encode_cursor(values, direction=CURSOR_NEXT):
+    """Encode the sort-key values of a row into an opaque cursor.
+
+    :param values:
+        A list with the values of the keyset columns of the boundary row,
+        in the same order as the sort spec (primary key last).
+
+    :param direction:
+        ``next`` to fetch the rows after the boundary row or ``prev`` to
+        fetch the rows before it.
+
+    :returns:
+        An URL safe string.
+    """
+    payload = {"d": direction, "v": [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor created by :func:`encode_cursor`.
+
+    :returns:
+        A 2-tuple with the list of keyset values and the direction.
+
+    :raise InvalidCursor:
+        If the cursor is malformed.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding)
+        payload = json.loads(raw.decode("utf-8"))
+        direction = payload["d"]
+        values = [_decode_value(v) for v in payload["v"]]
+    except (
+        TypeError,
+        ValueError,
+        KeyError,
+        binascii.Error,
+        UnicodeDecodeError,
+    ):
+        raise InvalidCursor("Cursor `{}` is not valid.".format(cursor))
+
+    if direction not in (CURSOR_NEXT, CURSOR_PREV):
+        raise InvalidCursor("Cursor `{}` is not valid.".format(cursor))
+
+    return values, direction
@@ -24,3 +24,7 @@ class BadQuery(Exception):
 
 class InvalidPage(Exception):
     pass
+
+
+class InvalidCursor(Exception):
+    pass
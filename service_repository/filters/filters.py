@@ -1,4 +1,4 @@
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 from collections.abc import Iterable
 from inspect import signature
 from itertools import chain
@@ -8,7 +8,12 @@ from sqlalchemy import and_, func, not_, or_
 from sqlalchemy.sql.selectable import Select
 
 from .exceptions import BadFilterFormat
-from .models import Field, get_default_model, get_model_from_spec
+from .models import (
+    Field,
+    get_default_model,
+    get_model_from_spec,
+    get_query_models,
+)
 
 BooleanFunction = namedtuple(
     "BooleanFunction", ("key", "sqlalchemy_fn", "only_one_arg")
@@ -47,6 +52,10 @@ class Operator(object):
         "any": lambda f, a: f.any(a),
         "not_any": lambda f, a: func.not_(f.any(a)),
     }
+    ARITIES = {
+        key: len(signature(function).parameters)
+        for key, function in OPERATORS.items()
+    }
 
     def __init__(self, operator=None):
         if not operator:
@@ -57,7 +66,7 @@ class Operator(object):
 
         self.operator = operator
         self.function = self.OPERATORS[operator]
-        self.arity = len(signature(self.function).parameters)
+        self.arity = self.ARITIES[operator]
 
 
 class Filter(object):
@@ -125,6 +134,137 @@ class BooleanFilter(object):
         )
 
 
+class CompiledFilters(object):
+    """Filters of one spec shape, with the models, fields and operators
+    already resolved, so only the values are applied on each use."""
+
+    def __init__(self, filters, query, default_model):
+        self.nodes = self._compile(filters, query, default_model)
+
+    def _compile(self, filters, query, default_model):
+        nodes = []
+        for filter in filters:
+            if isinstance(filter, BooleanFilter):
+                nodes.append(
+                    (
+                        filter.function,
+                        self._compile(filter.filters, query, default_model),
+                    )
+                )
+                continue
+
+            model = get_model_from_spec(
+                filter.filter_spec, query, default_model
+            )
+            field = Field(model, filter.filter_spec["field"])
+            nodes.append(
+                (
+                    field.get_sqlalchemy_field(),
+                    filter.operator.function,
+                    filter.operator.arity,
+                )
+            )
+        return nodes
+
+    def format_for_sqlalchemy(self, values):
+        """Build the SQLAlchemy filters with the `values` of the spec, in
+        the order returned by :func:`get_spec_values`."""
+        return self._build(self.nodes, iter(values))
+
+    def _build(self, nodes, values):
+        sqlalchemy_filters = []
+        for node in nodes:
+            if len(node) == 2:
+                function, children = node
+                sqlalchemy_filters.append(
+                    function(*self._build(children, values))
+                )
+                continue
+
+            sqlalchemy_field, function, arity = node
+            value = next(values)
+            if arity == 1:
+                sqlalchemy_filters.append(function(sqlalchemy_field))
+            else:
+                sqlalchemy_filters.append(function(sqlalchemy_field, value))
+        return sqlalchemy_filters
+
+
+COMPILED_FILTERS_MAXSIZE = 1024
+"""
+Maximum of spec shapes kept compiled, the least recently used are dropped.
+"""
+
+_compiled_filters = OrderedDict()
+
+
+def get_spec_shape(filter_spec):
+    """Return a hashable representation of `filter_spec` without values.
+
+    Specs that only differ in their values share the same shape.
+    """
+    if _is_iterable_filter(filter_spec):
+        return tuple(get_spec_shape(item) for item in filter_spec)
+
+    if isinstance(filter_spec, dict):
+        for boolean_function in BOOLEAN_FUNCTIONS:
+            if boolean_function.key in filter_spec:
+                return (
+                    boolean_function.key,
+                    get_spec_shape(filter_spec[boolean_function.key]),
+                )
+
+    return (
+        filter_spec.get("model"),
+        filter_spec.get("field"),
+        filter_spec.get("op"),
+        "value" in filter_spec,
+    )
+
+
+def get_spec_values(filter_spec):
+    """Return the values of `filter_spec`, one per filter, in order."""
+    if _is_iterable_filter(filter_spec):
+        return list(
+            chain.from_iterable(get_spec_values(item) for item in filter_spec)
+        )
+
+    if isinstance(filter_spec, dict):
+        for boolean_function in BOOLEAN_FUNCTIONS:
+            if boolean_function.key in filter_spec:
+                return get_spec_values(filter_spec[boolean_function.key])
+
+    return [filter_spec.get("value")]
+
+
+def compile_filters(query, filter_spec):
+    """Get the :class:`CompiledFilters` of the shape of `filter_spec` on the
+    models of `query`, compiling it on the first use."""
+    query_models = tuple(get_query_models(query).values())
+
+    try:
+        key = (query_models, get_spec_shape(filter_spec))
+        compiled = _compiled_filters.get(key)
+    except (AttributeError, TypeError):
+        # Not a valid spec, let the parsing tell why.
+        key, compiled = None, None
+
+    if compiled is not None:
+        _compiled_filters.move_to_end(key)
+        return compiled
+
+    compiled = CompiledFilters(
+        build_filters(filter_spec), query, get_default_model(query)
+    )
+
+    if key is not None:
+        _compiled_filters[key] = compiled
+        while len(_compiled_filters) > COMPILED_FILTERS_MAXSIZE:
+            _compiled_filters.popitem(last=False)
+
+    return compiled
+
+
 def _is_iterable_filter(filter_spec):
     """`filter_spec` may be a list of nested filter specs, or a dict."""
     return isinstance(filter_spec, Iterable) and not isinstance(
@@ -212,17 +352,19 @@ def apply_filters(stmt: Select, filter_spec, do_auto_join=True):
                 ]
             }
 
+        The spec is parsed and its fields resolved once per shape, as
+        long as the spec only differs in its values the compiled filters
+        are reused.
+
     :returns:
         The :class:`sqlalchemy.sql.selectable.Select` instance after all the
         filters have been applied.
     """
-    filters = build_filters(filter_spec)
+    compiled = compile_filters(stmt, filter_spec)
 
-    default_model = get_default_model(stmt)
-
-    sqlalchemy_filters = [
-        filter.format_for_sqlalchemy(stmt, default_model) for filter in filters
-    ]
+    sqlalchemy_filters = compiled.format_for_sqlalchemy(
+        get_spec_values(filter_spec)
+    )
 
     if sqlalchemy_filters:
         stmt = stmt.where(*sqlalchemy_filters)
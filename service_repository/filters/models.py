@@ -1,5 +1,8 @@
 import types
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
 
+from sqlalchemy import event
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm.mapper import Mapper
@@ -8,6 +11,90 @@ from sqlalchemy.util import symbol
 from .exceptions import BadQuery, BadSpec, FieldNotFound
 
 
+class ModelMeta(object):
+    """The mapper information of a model used to filter, sort, count and
+    paginate, inspected once per mapped class."""
+
+    def __init__(self, model):
+        inspect_mapper = inspect(model)
+        orm_descriptors = inspect_mapper.all_orm_descriptors
+
+        self.model = model
+        self.column_types = {
+            key: column.type for key, column in inspect_mapper.columns.items()
+        }
+        self.hybrid_properties = {
+            key: item
+            for key, item in orm_descriptors.items()
+            if _is_hybrid_property(item)
+        }
+        self.hybrid_methods = {
+            key: item
+            for key, item in orm_descriptors.items()
+            if _is_hybrid_method(item)
+        }
+        self.field_names = frozenset(
+            set(self.column_types)
+            | set(self.hybrid_properties)
+            | set(self.hybrid_methods)
+        )
+        self.primary_key = tuple(
+            model.__table__.primary_key.columns_autoinc_first
+        )
+        self.primary_key_fields = tuple(
+            getattr(model, column.name) for column in self.primary_key
+        )
+        self.statements = OrderedDict()
+
+
+STATEMENTS_MAXSIZE = 256
+"""
+Maximum of statements kept per model, the least recently used are dropped.
+"""
+
+
+_model_meta = WeakKeyDictionary()
+
+
+def get_model_meta(model):
+    """Get the :class:`ModelMeta` of `model`, inspecting it on first use."""
+    try:
+        return _model_meta[model]
+    except KeyError:
+        meta = _model_meta[model] = ModelMeta(model)
+        return meta
+
+
+def get_statement(model, key, build):
+    """Get the statement of `key` of `model`, built by ``build()`` on the
+    first use, so the canonical statements of a repository are constructed
+    once. The statements must take their values as bind parameters."""
+    statements = get_model_meta(model).statements
+    try:
+        statement = statements[key]
+    except KeyError:
+        statement = statements[key] = build()
+        while len(statements) > STATEMENTS_MAXSIZE:
+            statements.popitem(last=False)
+        return statement
+
+    statements.move_to_end(key)
+    return statement
+
+
+def clear_model_meta(model=None):
+    """Forget the :class:`ModelMeta` of `model`, or of all the models."""
+    if model is None:
+        _model_meta.clear()
+    else:
+        _model_meta.pop(model, None)
+
+
+@event.listens_for(Mapper, "mapper_configured")
+def _on_mapper_configured(mapper, class_):
+    clear_model_meta(class_)
+
+
 class Field(object):
     def __init__(self, model, field_name):
         self.model = model
@@ -30,18 +117,7 @@ class Field(object):
         return sqlalchemy_field
 
     def _get_valid_field_names(self):
-        inspect_mapper = inspect(self.model)
-        columns = inspect_mapper.columns
-        orm_descriptors = inspect_mapper.all_orm_descriptors
-
-        column_names = columns.keys()
-        hybrid_names = [
-            key
-            for key, item in orm_descriptors.items()
-            if _is_hybrid_property(item) or _is_hybrid_method(item)
-        ]
-
-        return set(column_names) | set(hybrid_names)
+        return get_model_meta(self.model).field_names
 
 
 def _is_hybrid_property(orm_descriptor):
@@ -0,0 +1,403 @@
+"""Compile the filter and sort specs of :mod:`.filters` and :mod:`.sorting`
+into MongoDB query documents and sort lists.
+
+This module does not depend on SQLAlchemy.
+"""
+import re
+from collections import OrderedDict
+from collections.abc import Iterable
+from itertools import chain
+
+from six import string_types
+
+from .exceptions import BadFilterFormat, BadSortFormat
+
+ASCENDING = 1
+DESCENDING = -1
+
+SORT_ASCENDING = "asc"
+SORT_DESCENDING = "desc"
+
+
+def like_to_regex(pattern):
+    """Translate a SQL ``LIKE`` pattern into an anchored regex."""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return "^{}$".format("".join(parts))
+
+
+OPERATORS = {
+    "is_null": (1, lambda f: {f: None}),
+    "is_not_null": (1, lambda f: {f: {"$exists": True, "$ne": None}}),
+    "==": (2, lambda f, a: {f: {"$eq": a}}),
+    "eq": (2, lambda f, a: {f: {"$eq": a}}),
+    "!=": (2, lambda f, a: {f: {"$ne": a}}),
+    "ne": (2, lambda f, a: {f: {"$ne": a}}),
+    ">": (2, lambda f, a: {f: {"$gt": a}}),
+    "gt": (2, lambda f, a: {f: {"$gt": a}}),
+    "<": (2, lambda f, a: {f: {"$lt": a}}),
+    "lt": (2, lambda f, a: {f: {"$lt": a}}),
+    ">=": (2, lambda f, a: {f: {"$gte": a}}),
+    "ge": (2, lambda f, a: {f: {"$gte": a}}),
+    "<=": (2, lambda f, a: {f: {"$lte": a}}),
+    "le": (2, lambda f, a: {f: {"$lte": a}}),
+    "like": (2, lambda f, a: {f: {"$regex": like_to_regex(a)}}),
+    "ilike": (
+        2,
+        lambda f, a: {f: {"$regex": like_to_regex(a), "$options": "i"}},
+    ),
+    "not_ilike": (
+        2,
+        lambda f, a: {f: {"$not": re.compile(like_to_regex(a), re.I)}},
+    ),
+    "in": (2, lambda f, a: {f: {"$in": list(a)}}),
+    "not_in": (2, lambda f, a: {f: {"$nin": list(a)}}),
+    "any": (2, lambda f, a: {f: {"$elemMatch": {"$eq": a}}}),
+    "not_any": (2, lambda f, a: {f: {"$not": {"$elemMatch": {"$eq": a}}}}),
+}
+"""
+The operators of the filter spec, with their arity and MongoDB query.
+"""
+
+BOOLEAN_FUNCTIONS = {
+    "or": (False, lambda *clauses: {"$or": list(clauses)}),
+    "and": (False, lambda *clauses: {"$and": list(clauses)}),
+    "not": (True, lambda clause: {"$nor": [clause]}),
+}
+"""
+The boolean functions of the filter spec, with whether they take only one
+argument and their MongoDB query.
+"""
+
+COMPILED_MAXSIZE = 1024
+"""
+Maximum of spec shapes kept compiled, the least recently used are dropped.
+"""
+
+_compiled = OrderedDict()
+
+
+def is_filter_spec(criteria):
+    """Tell if `criteria` is a filter spec rather than a MongoDB query.
+
+    Filter specs are lists, or dicts with a ``field`` or a boolean function
+    key, which never clash with MongoDB queries as operators there start
+    with ``$``.
+    """
+    if _is_iterable_filter(criteria):
+        return True
+    return isinstance(criteria, dict) and (
+        "field" in criteria
+        or any(key in criteria for key in BOOLEAN_FUNCTIONS)
+    )
+
+
+def is_sort_spec(sort):
+    """Tell if `sort` is a sort spec rather than a MongoDB sort list."""
+    if isinstance(sort, dict):
+        return True
+    return bool(sort) and all(isinstance(item, dict) for item in sort)
+
+
+def get_field_name(model, field_name):
+    """Return the document key of `field_name`, following the alias of the
+    field in `model`, like ``id`` to ``_id``."""
+    fields = getattr(model, "__fields__", None) or {}
+    head, dot, rest = field_name.partition(".")
+    if head in fields:
+        return fields[head].alias + dot + rest
+    return field_name
+
+
+class CompiledMongoFilters(object):
+    """Filters of one spec shape, with the keys, operators and boolean
+    structure already resolved, so only the values are applied on each
+    use."""
+
+    def __init__(self, filter_spec, model=None):
+        self.model = model
+        self.nodes = self._compile(filter_spec)
+
+    def _compile(self, filter_spec):
+        if _is_iterable_filter(filter_spec):
+            return list(
+                chain.from_iterable(
+                    self._compile(item) for item in filter_spec
+                )
+            )
+
+        if isinstance(filter_spec, dict):
+            for key, (only_one_arg, function) in BOOLEAN_FUNCTIONS.items():
+                if key not in filter_spec:
+                    continue
+
+                fn_args = filter_spec[key]
+                if not _is_iterable_filter(fn_args):
+                    raise BadFilterFormat(
+                        "`{}` value must be an iterable across the function "
+                        "arguments".format(key)
+                    )
+                if only_one_arg and len(fn_args) != 1:
+                    raise BadFilterFormat(
+                        "`{}` must have one argument".format(key)
+                    )
+                if not only_one_arg and len(fn_args) < 1:
+                    raise BadFilterFormat(
+                        "`{}` must have one or more arguments".format(key)
+                    )
+                return [(function, self._compile(fn_args))]
+
+        try:
+            field_name = filter_spec["field"]
+        except KeyError:
+            raise BadFilterFormat("`field` is a mandatory filter attribute.")
+        except TypeError:
+            raise BadFilterFormat(
+                "Filter spec `{}` should be a dictionary.".format(filter_spec)
+            )
+
+        operator = filter_spec.get("op") or "=="
+        if operator not in OPERATORS:
+            raise BadFilterFormat("Operator `{}` not valid.".format(operator))
+
+        arity, function = OPERATORS[operator]
+        if arity == 2 and "value" not in filter_spec:
+            raise BadFilterFormat("`value` must be provided.")
+
+        return [(get_field_name(self.model, field_name), function, arity)]
+
+    def to_query(self, values):
+        """Build the MongoDB query with the `values` of the spec, in the
+        order returned by :func:`get_spec_values`."""
+        clauses = self._build(self.nodes, iter(values))
+        if not clauses:
+            return {}
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def _build(self, nodes, values):
+        clauses = []
+        for node in nodes:
+            if len(node) == 2:
+                function, children = node
+                clauses.append(function(*self._build(children, values)))
+                continue
+
+            field_name, function, arity = node
+            value = next(values)
+            if arity == 1:
+                clauses.append(function(field_name))
+            else:
+                clauses.append(function(field_name, value))
+        return clauses
+
+
+def get_spec_shape(filter_spec):
+    """Return a hashable representation of `filter_spec` without values."""
+    if _is_iterable_filter(filter_spec):
+        return tuple(get_spec_shape(item) for item in filter_spec)
+
+    for key in BOOLEAN_FUNCTIONS:
+        if key in filter_spec:
+            return (key, get_spec_shape(filter_spec[key]))
+
+    return (
+        filter_spec.get("field"),
+        filter_spec.get("op"),
+        "value" in filter_spec,
+    )
+
+
+def get_spec_values(filter_spec):
+    """Return the values of `filter_spec`, one per filter, in order."""
+    if _is_iterable_filter(filter_spec):
+        return list(
+            chain.from_iterable(get_spec_values(item) for item in filter_spec)
+        )
+
+    for key in BOOLEAN_FUNCTIONS:
+        if key in filter_spec:
+            return get_spec_values(filter_spec[key])
+
+    return [filter_spec.get("value")]
+
+
+def compile_mongo_filters(filter_spec, model=None):
+    """Get the :class:`CompiledMongoFilters` of the shape of `filter_spec`
+    on `model`, compiling it on the first use."""
+    try:
+        key = ("filters", model, get_spec_shape(filter_spec))
+        compiled = _compiled.get(key)
+    except (AttributeError, TypeError):
+        # Not a valid spec, let the parsing tell why.
+        key, compiled = None, None
+
+    if compiled is not None:
+        _compiled.move_to_end(key)
+        return compiled
+
+    compiled = CompiledMongoFilters(filter_spec, model)
+    if key is not None:
+        _remember(key, compiled)
+    return compiled
+
+
+def apply_mongo_filters(filter_spec, model=None):
+    """Return the MongoDB query of `filter_spec`.
+
+    :param filter_spec:
+        A filter spec as accepted by
+        :func:`service_repository.filters.filters.apply_filters`. A MongoDB
+        query is returned as it is.
+
+    :param model:
+        The pydantic model of the documents, used to follow field aliases.
+    """
+    if not is_filter_spec(filter_spec):
+        return filter_spec or {}
+
+    compiled = compile_mongo_filters(filter_spec, model)
+    return compiled.to_query(get_spec_values(filter_spec))
+
+
+def apply_mongo_sort(sort_spec, model=None):
+    """Return the MongoDB sort list of `sort_spec`.
+
+    :param sort_spec:
+        A sort spec as accepted by
+        :func:`service_repository.filters.sorting.apply_sort`. A MongoDB
+        sort list is returned as it is.
+
+    :raise BadSortFormat:
+        If the spec is malformed or asks for nulls in an order MongoDB does
+        not sort them, where nulls come before any other value.
+    """
+    if not is_sort_spec(sort_spec):
+        return list(sort_spec or [])
+
+    if isinstance(sort_spec, dict):
+        sort_spec = [sort_spec]
+
+    try:
+        key = ("sort", model, tuple(tuple(item.items()) for item in sort_spec))
+        compiled = _compiled.get(key)
+    except TypeError:
+        key, compiled = None, None
+
+    if compiled is None:
+        compiled = [_compile_sort(item, model) for item in sort_spec]
+        if key is not None:
+            _remember(key, compiled)
+    else:
+        _compiled.move_to_end(key)
+
+    return list(compiled)
+
+
+def _compile_sort(sort_spec, model):
+    try:
+        field_name = sort_spec["field"]
+        direction = sort_spec["direction"]
+    except KeyError:
+        raise BadSortFormat(
+            "`field` and `direction` are mandatory attributes."
+        )
+
+    if direction not in [SORT_ASCENDING, SORT_DESCENDING]:
+        raise BadSortFormat("Direction `{}` not valid.".format(direction))
+
+    ascending = direction == SORT_ASCENDING
+    if (sort_spec.get("nullsfirst") and not ascending) or (
+        sort_spec.get("nullslast") and ascending
+    ):
+        raise BadSortFormat(
+            "MongoDB sorts nulls first on `{}` direction.".format(direction)
+        )
+
+    return (
+        get_field_name(model, field_name),
+        ASCENDING if ascending else DESCENDING,
+    )
+
+
+def _remember(key, compiled):
+    _compiled[key] = compiled
+    while len(_compiled) > COMPILED_MAXSIZE:
+        _compiled.popitem(last=False)
+
+
+def _is_iterable_filter(filter_spec):
+    """`filter_spec` may be a list of nested filter specs, or a dict."""
+    return isinstance(filter_spec, Iterable) and not isinstance(
+        filter_spec, (string_types, dict)
+    )
+
+
+def _get_query_fields(query):
+    for key, value in query.items():
+        if key in ("$and", "$or", "$nor"):
+            for clause in value:
+                yield from _get_query_fields(clause)
+        elif not key.startswith("$"):
+            yield key
+
+
+def _is_query_indexed(query, leading_fields):
+    for key, value in query.items():
+        if key == "$and":
+            if any(_is_query_indexed(c, leading_fields) for c in value):
+                return True
+        elif key == "$or":
+            if all(_is_query_indexed(c, leading_fields) for c in value):
+                return True
+        elif not key.startswith("$") and key in leading_fields:
+            return True
+    return False
+
+
+def _is_sort_indexed(sort, index_keys):
+    sort = [(key, direction) for key, direction in sort]
+    reverse = [(key, -direction) for key, direction in sort]
+    for keys in index_keys:
+        prefix = [(key, direction) for key, direction in keys[: len(sort)]]
+        if prefix in (sort, reverse):
+            return True
+    return False
+
+
+def get_index_warnings(index_information, query, sort=None):
+    """Tell why `query` and `sort` can not use the indexes of a collection.
+
+    :param index_information:
+        The result of ``collection.index_information()``.
+
+    :returns:
+        A list of messages, empty when an index can be used. The messages
+        name the fields, never the values, so they can be deduplicated.
+    """
+    index_keys = [index["key"] for index in index_information.values()]
+    leading_fields = {keys[0][0] for keys in index_keys if keys}
+
+    warnings = []
+    if query and not _is_query_indexed(query, leading_fields):
+        warnings.append(
+            "No index starts with a field of the query on `{}`.".format(
+                ", ".join(sorted(set(_get_query_fields(query))))
+            )
+        )
+    if sort and not _is_sort_indexed(sort, index_keys):
+        warnings.append(
+            "No index matches the sort `{}`.".format(
+                ", ".join(
+                    "{} {}".format(key, direction) for key, direction in sort
+                )
+            )
+        )
+    return warnings
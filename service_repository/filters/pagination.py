@@ -1,11 +1,40 @@
+import asyncio
+import json
 import math
 from collections import namedtuple
 
-from sqlalchemy import func
+from sqlalchemy import and_, bindparam, func, or_, text, tuple_
+from sqlalchemy.exc import CompileError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel.main import SQLModel
 
-from service_repository.exceptions import InvalidPage
+from service_repository.cursor import (
+    CURSOR_NEXT,
+    CURSOR_PREV,
+    decode_cursor,
+    encode_cursor,
+)
+from service_repository.exceptions import InvalidCursor, InvalidPage
+
+from .exceptions import BadSortFormat
+from .models import Field, get_model_from_spec, get_model_meta
+from .sorting import SORT_ASCENDING, SORT_DESCENDING, Sort
+
+Keyset = namedtuple("Keyset", ["field_name", "column", "direction"])
+
+KeysetPagination = namedtuple(
+    "KeysetPagination", ["page_size", "next_cursor", "prev_cursor"]
+)
+
+Pagination = namedtuple(
+    "Pagination",
+    ["page_number", "page_size", "num_pages", "total_results"],
+)
+
+OffsetPagination = namedtuple(
+    "OffsetPagination",
+    ["page_number", "page_size", "num_pages", "total_results", "has_next"],
+)
 
 
 async def apply_pagination(
@@ -14,6 +43,8 @@ async def apply_pagination(
     model: SQLModel,
     page_number=None,
     page_size=None,
+    count_mode="exact",
+    total_results=None,
 ):
     """Apply pagination to a SQLAlchemy stmt object.
 
@@ -33,6 +64,18 @@ async def apply_pagination(
         Maximum number of results to be returned in the page (defaults
         to the total results).
 
+    :param count_mode:
+        How ``total_results`` is obtained: ``exact`` runs a ``COUNT``,
+        ``estimated`` uses the PostgreSQL statistics (falling back to
+        ``exact`` on other databases) and ``none`` skips it, leaving
+        ``total_results`` and ``num_pages`` as `None` and limiting the stmt
+        to ``page_size + 1`` rows, so the caller can tell if there is a
+        next page.
+
+    :param total_results:
+        A total already known by the caller, like a cached one. When given
+        no count is done.
+
     :returns:
         A 2-tuple with the paginated SQLAlchemy stmt object and
         a pagination namedtuple.
@@ -57,36 +100,361 @@ async def apply_pagination(
         22
         >>> page_size, page_number, num_pages, total_results = pagination
     """
-    primary_key = getattr(
-        model, model.__table__.primary_key.columns_autoinc_first[0].name
-    )
+    if total_results is None:
+        total_results = await count_results(stmt, session, model, count_mode)
 
-    query_count = await session.execute(
-        stmt.with_only_columns(func.count(primary_key))
-    )
+    return _paginate(stmt, page_number, page_size, total_results)
 
-    total_results = query_count.scalar_one()
-    stmt = _limit(stmt, page_size)
 
-    # Page size defaults to total results
-    if page_size is None:
-        page_size = total_results
+async def execute_pagination(
+    stmt,
+    session: AsyncSession,
+    model: SQLModel,
+    page_number=None,
+    page_size=None,
+    count_mode="exact",
+    total_results=None,
+    count_session: AsyncSession = None,
+    scalars=True,
+):
+    """Apply pagination to a SQLAlchemy stmt object and execute it.
+
+    Takes the same arguments of :func:`apply_pagination`, plus:
+
+    :param count_session:
+        Another :class:`sqlalchemy.ext.asyncio.AsyncSession`, from the
+        same connection pool. When given the count runs on it at the same
+        time the page runs on `session`, so the latency is the slowest of
+        both queries instead of their sum. Changes not committed in
+        `session` are not seen by the count.
+
+    :param scalars:
+        Return the first column of each row, the instances when `stmt`
+        selects a model, or the rows when `False`.
+
+    :returns:
+        A 2-tuple with the list of instances of the page and a
+        pagination namedtuple with the fields of :func:`apply_pagination`
+        plus ``has_next``.
+    """
+    counting = total_results is None and count_mode != "none"
+    # Without page size the offset of later pages depends on the total.
+    independent = page_size is not None or page_number in (None, 1)
+
+    if counting and count_session is not None and independent:
+        page_stmt = _offset(
+            _limit(stmt, page_size), page_number, page_size or 0
+        )
+        total_results, query = await asyncio.gather(
+            count_results(stmt, count_session, model, count_mode),
+            session.execute(page_stmt),
+        )
+        _, pagination = _paginate(stmt, page_number, page_size, total_results)
+    else:
+        stmt, pagination = await apply_pagination(
+            stmt,
+            session=session,
+            model=model,
+            page_number=page_number,
+            page_size=page_size,
+            count_mode=count_mode,
+            total_results=total_results,
+        )
+        query = await session.execute(stmt)
+
+    items = query.scalars().all() if scalars else query.all()
+
+    if pagination.total_results is None:
+        has_next = page_size is not None and len(items) > page_size
+        items = items[:page_size]
+    else:
+        has_next = pagination.page_number < pagination.num_pages
+
+    return items, OffsetPagination(*pagination, has_next=has_next)
+
 
-    stmt = _offset(stmt, page_number, page_size)
+async def count_results(
+    stmt, session: AsyncSession, model: SQLModel, count_mode="exact"
+):
+    """Count the results of a SQLAlchemy stmt object.
+
+    :returns:
+        The total of results for ``exact`` and ``estimated`` count modes or
+        `None` for ``none``.
+    """
+    if count_mode == "exact":
+        return await _count(stmt, session, model)
+    elif count_mode == "estimated":
+        return await _estimate(stmt, session, model)
+    elif count_mode != "none":
+        raise ValueError("Count mode `{}` not valid.".format(count_mode))
+
+
+def _paginate(stmt, page_number, page_size, total_results):
+    if total_results is None:
+        # Fetch one extra row to know if there is a page after this one.
+        stmt = _limit(stmt, None if page_size is None else page_size + 1)
+
+        if page_size is not None:
+            stmt = _offset(stmt, page_number, page_size)
+    else:
+        stmt = _limit(stmt, page_size)
+
+        # Page size defaults to total results
+        if page_size is None:
+            page_size = total_results
+
+        stmt = _offset(stmt, page_number, page_size)
 
     # Page number defaults to 1
     if page_number is None:
         page_number = 1
 
-    num_pages = _calculate_num_pages(page_size, total_results)
+    num_pages = None
+    if total_results is not None:
+        num_pages = _calculate_num_pages(page_size, total_results)
 
-    Pagination = namedtuple(
-        "Pagination",
-        ["page_number", "page_size", "num_pages", "total_results"],
-    )
     return stmt, Pagination(page_number, page_size, num_pages, total_results)
 
 
+async def _count(stmt, session, model):
+    primary_key = get_model_meta(model).primary_key_fields[0]
+
+    query_count = await session.execute(
+        stmt.with_only_columns(func.count(primary_key)).order_by(None)
+    )
+
+    return query_count.scalar_one()
+
+
+async def _estimate(stmt, session, model):
+    """Estimate the results of `stmt` from the PostgreSQL statistics.
+
+    Without filters the table row estimate of ``pg_class.reltuples`` is
+    used, otherwise the row estimate of the planner. Other databases, never
+    analyzed tables and statements that can not be rendered with literal
+    values fall back to an exact count.
+    """
+    bind = session.bind
+    if bind is None or bind.dialect.name != "postgresql":
+        return await _count(stmt, session, model)
+
+    if stmt.whereclause is None:
+        query = await session.execute(
+            text(
+                "SELECT reltuples FROM pg_class "
+                "WHERE oid = CAST(:table AS regclass)"
+            ),
+            {"table": model.__table__.fullname},
+        )
+        estimate = query.scalar_one_or_none()
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    else:
+        try:
+            compiled = stmt.compile(
+                dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+            )
+        except (CompileError, NotImplementedError):
+            compiled = None
+
+        if compiled is not None:
+            # Run as is, text() would parse the values again, taking a
+            # ":name" in a string for a bind parameter.
+            connection = await session.connection()
+            query = await connection.exec_driver_sql(
+                "EXPLAIN (FORMAT JSON) {}".format(compiled)
+            )
+            plan = query.scalar_one()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+
+    return await _count(stmt, session, model)
+
+
+async def apply_keyset_pagination(
+    stmt,
+    session: AsyncSession,
+    model: SQLModel,
+    sort_spec=None,
+    cursor=None,
+    page_size=None,
+    scalars=True,
+):
+    """Apply keyset (seek) pagination to a SQLAlchemy stmt and execute it.
+
+    Instead of skipping ``(page_number - 1) * page_size`` rows, the page
+    starts right after (or before) the row the cursor was built from, so
+    every page costs the same no matter how deep it is. The primary key is
+    appended to the sort spec as tiebreaker, so the ordering is total.
+
+    :param stmt:
+        A :class:`sqlalchemy.sql.selectable.Select` instance, without
+        ordering applied.
+
+    :param session:
+        A :class:`sqlalchemy.ext.asyncio.AsyncSession` instance.
+
+    :param model:
+        A :class:`sqlmodel.main.SQLModel` class.
+
+    :param sort_spec:
+        The same spec accepted by
+        :func:`service_repository.filters.sorting.apply_sort`. The
+        `nullsfirst` and `nullslast` options are not supported, keyset
+        columns are expected to be not nullable.
+
+    :param cursor:
+        An opaque cursor taken from ``next_cursor`` or ``prev_cursor`` of
+        a previous page, or `None` for the first page.
+
+    :param page_size:
+        Maximum number of results to be returned in the page (defaults
+        to all the remaining results).
+
+    :param scalars:
+        Return the instances, or the rows when `False`. The rows must have
+        the keyset columns.
+
+    :returns:
+        A 2-tuple with the list of instances of the page and a
+        pagination namedtuple with ``page_size``, ``next_cursor`` and
+        ``prev_cursor``. Cursors are `None` when there is no such page.
+
+    Basic usage::
+
+        items, pagination = await apply_keyset_pagination(
+            stmt, session, Song, sort_spec=sort, page_size=10
+        )
+        items, pagination = await apply_keyset_pagination(
+            stmt,
+            session,
+            Song,
+            sort_spec=sort,
+            cursor=pagination.next_cursor,
+            page_size=10,
+        )
+    """
+    keys = _get_keyset_keys(stmt, model, sort_spec)
+
+    values, direction = None, CURSOR_NEXT
+    if cursor is not None:
+        values, direction = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise InvalidCursor(
+                "Cursor `{}` does not match the sort spec.".format(cursor)
+            )
+
+    backwards = direction == CURSOR_PREV
+
+    if values is not None:
+        stmt = stmt.where(_keyset_predicate(keys, values, backwards))
+
+    stmt = stmt.order_by(*[_keyset_order(key, backwards) for key in keys])
+
+    # Fetch one extra row to know if there is a page after this one.
+    stmt = _limit(stmt, None if page_size is None else page_size + 1)
+
+    query = await session.execute(stmt)
+    items = query.scalars().all() if scalars else query.all()
+
+    has_more = page_size is not None and len(items) > page_size
+    if has_more:
+        items = items[:page_size]
+
+    if backwards:
+        items.reverse()
+
+    # Walking backwards there is always the page the cursor came from.
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else values is not None
+
+    next_cursor, prev_cursor = None, None
+    if items:
+        if has_next:
+            next_cursor = encode_cursor(
+                _keyset_values(items[-1], keys), CURSOR_NEXT
+            )
+        if has_prev:
+            prev_cursor = encode_cursor(
+                _keyset_values(items[0], keys), CURSOR_PREV
+            )
+    elif values is not None:
+        # Walked past the edge, allow to go back from the same boundary.
+        if backwards:
+            next_cursor = encode_cursor(values, CURSOR_NEXT)
+        else:
+            prev_cursor = encode_cursor(values, CURSOR_PREV)
+
+    if page_size is None:
+        page_size = len(items)
+
+    return items, KeysetPagination(page_size, next_cursor, prev_cursor)
+
+
+def _get_keyset_keys(stmt, model, sort_spec):
+    if isinstance(sort_spec, dict):
+        sort_spec = [sort_spec]
+
+    keys = []
+    for item in sort_spec or []:
+        sort = Sort(item)
+        if get_model_from_spec(item, stmt, model) is not model:
+            raise BadSortFormat(
+                "Keyset pagination only sorts by fields of `{}`.".format(
+                    model.__name__
+                )
+            )
+        column = Field(model, sort.field_name).get_sqlalchemy_field()
+        keys.append(Keyset(sort.field_name, column, sort.direction))
+
+    field_names = {key.field_name for key in keys}
+    meta = get_model_meta(model)
+    for column, field in zip(meta.primary_key, meta.primary_key_fields):
+        if column.name not in field_names:
+            keys.append(Keyset(column.name, field, SORT_ASCENDING))
+
+    return keys
+
+
+def _keyset_values(instance, keys):
+    return [getattr(instance, key.field_name) for key in keys]
+
+
+def _keyset_order(key, backwards):
+    ascending = (key.direction == SORT_ASCENDING) != backwards
+    return key.column.asc() if ascending else key.column.desc()
+
+
+def _keyset_predicate(keys, values, backwards):
+    directions = {key.direction for key in keys}
+    values = [
+        bindparam(None, value, type_=key.column.type)
+        for key, value in zip(keys, values)
+    ]
+
+    if len(directions) == 1:
+        # Row value comparison, can be answered by a composite index.
+        columns = tuple_(*[key.column for key in keys])
+        boundary = tuple_(*values)
+        if (directions.pop() == SORT_DESCENDING) != backwards:
+            return columns < boundary
+        return columns > boundary
+
+    # Mixed directions, expand to (k1 > v1) OR (k1 = v1 AND k2 < v2) ...
+    clauses = []
+    for index, key in enumerate(keys):
+        equals = [keys[i].column == values[i] for i in range(index)]
+        if (key.direction == SORT_DESCENDING) != backwards:
+            equals.append(key.column < values[index])
+        else:
+            equals.append(key.column > values[index])
+        clauses.append(and_(*equals))
+
+    return or_(*clauses)
+
+
 def _limit(query, page_size):
     if page_size is not None:
         if page_size < 0:
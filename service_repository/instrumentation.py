@@ -0,0 +1,546 @@
+import functools
+import time
+from abc import ABCMeta, abstractmethod
+from contextvars import ContextVar
+
+_span = ContextVar("service_repository_span", default=None)
+_sqlalchemy_listening = False
+
+CURSOR_METHODS = frozenset(("find", "aggregate", "list_indexes"))
+"""Methods of a Motor collection returning a cursor."""
+
+COMMAND_METHODS = frozenset(
+    (
+        "bulk_write",
+        "count_documents",
+        "create_index",
+        "delete_many",
+        "delete_one",
+        "distinct",
+        "estimated_document_count",
+        "find_one",
+        "find_one_and_delete",
+        "find_one_and_replace",
+        "find_one_and_update",
+        "index_information",
+        "insert_many",
+        "insert_one",
+        "replace_one",
+        "update_many",
+        "update_one",
+    )
+)
+"""Methods of a Motor collection running one command."""
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def current_span():
+    """Return the :class:`Span` of the service call running, or `None`."""
+    return _span.get()
+
+
+class Span(object):
+    """The measures of one call of a service.
+
+    - ``wall_time``: seconds of the whole call.
+    - ``db_time``: seconds waiting on the database, overlapping waits, like
+      a count gathered with the page, are counted once.
+    - ``python_time``: the rest, validation, serialization and the library.
+    - ``statements``: SQL statements, commits included, or MongoDB commands
+      and cursors issued.
+    - ``rows``: rows returned, the items of a page, or the rows written by
+      the bulk methods.
+    - ``cache_hits`` and ``cache_misses`` of the reads through the cache.
+
+    The measures of the calls of other services nested in it are added to
+    it too.
+    """
+
+    __slots__ = (
+        "operation",
+        "service",
+        "repository",
+        "parent",
+        "start",
+        "wall_time",
+        "db_time",
+        "statements",
+        "rows",
+        "cache_hits",
+        "cache_misses",
+        "error",
+        "_started",
+        "_db_depth",
+        "_db_started",
+    )
+
+    def __init__(self, operation, service, repository, parent=None):
+        self.operation = operation
+        self.service = service
+        self.repository = repository
+        self.parent = parent
+        self.start = time.time()
+        self.wall_time = 0.0
+        self.db_time = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.error = None
+        self._started = time.perf_counter()
+        self._db_depth = 0
+        self._db_started = 0.0
+
+    @property
+    def python_time(self):
+        return max(0.0, self.wall_time - self.db_time)
+
+    def enter_db(self):
+        """Start waiting on the database."""
+        self._db_depth += 1
+        if self._db_depth == 1:
+            self._db_started = time.perf_counter()
+
+    def exit_db(self, statements=1):
+        """Stop waiting on the database, after `statements` round trips."""
+        self._db_depth -= 1
+        if self._db_depth == 0:
+            self.db_time += time.perf_counter() - self._db_started
+        self.statements += statements
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._started
+        if self.parent is not None:
+            self.parent.db_time += self.db_time
+            self.parent.statements += self.statements
+            self.parent.cache_hits += self.cache_hits
+            self.parent.cache_misses += self.cache_misses
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "service": self.service,
+            "repository": self.repository,
+            "start": self.start,
+            "wall_time": self.wall_time,
+            "db_time": self.db_time,
+            "python_time": self.python_time,
+            "statements": self.statements,
+            "rows": self.rows,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "error": self.error,
+        }
+
+
+class Instrument(metaclass=ABCMeta):
+    """Class representing the instrumentation interface.
+
+    Set an instance as the ``instrument`` of a service to get a
+    :class:`Span` per call. Without one the services and the repositories
+    measure nothing.
+    """
+
+    @abstractmethod
+    def record(self, span: Span):
+        """Record the finished `span`, it must not block."""
+        raise NotImplementedError()
+
+
+class MemoryInstrument(Instrument):
+    """Aggregate the spans in memory, by service and operation."""
+
+    def __init__(self) -> None:
+        self.stats = {}
+
+    def record(self, span: Span):
+        key = (span.service, span.operation)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = {
+                "calls": 0,
+                "errors": 0,
+                "wall_time": 0.0,
+                "db_time": 0.0,
+                "python_time": 0.0,
+                "max_wall_time": 0.0,
+                "statements": 0,
+                "rows": 0,
+                "cache_hits": 0,
+                "cache_misses": 0,
+            }
+
+        stats["calls"] += 1
+        stats["errors"] += span.error is not None
+        stats["wall_time"] += span.wall_time
+        stats["db_time"] += span.db_time
+        stats["python_time"] += span.python_time
+        stats["max_wall_time"] = max(stats["max_wall_time"], span.wall_time)
+        stats["statements"] += span.statements
+        stats["rows"] += span.rows
+        stats["cache_hits"] += span.cache_hits
+        stats["cache_misses"] += span.cache_misses
+
+    def get(self, service, operation):
+        """Return the stats of `operation` of `service`, by its name."""
+        return self.stats.get((service, operation))
+
+    def clear(self):
+        self.stats.clear()
+
+
+class PrometheusInstrument(Instrument):
+    """Aggregate the spans in histograms and counters, rendered in the
+    Prometheus text format by ``render``, to serve on a metrics endpoint.
+
+    The metrics are labeled by service and operation:
+
+    - ``<namespace>_duration_seconds`` and ``<namespace>_db_duration_seconds``
+      histograms.
+    - ``<namespace>_calls_total``, ``<namespace>_errors_total``,
+      ``<namespace>_statements_total``, ``<namespace>_rows_total``,
+      ``<namespace>_cache_hits_total`` and
+      ``<namespace>_cache_misses_total`` counters.
+    """
+
+    COUNTERS = (
+        "calls",
+        "errors",
+        "statements",
+        "rows",
+        "cache_hits",
+        "cache_misses",
+    )
+
+    def __init__(
+        self, namespace="service_repository", buckets=DEFAULT_BUCKETS
+    ) -> None:
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = {"duration": {}, "db_duration": {}}
+        self.counters = {name: {} for name in self.COUNTERS}
+
+    def record(self, span: Span):
+        labels = (span.service, span.operation)
+        self._observe("duration", labels, span.wall_time)
+        self._observe("db_duration", labels, span.db_time)
+
+        counters = self.counters
+        for name, value in (
+            ("calls", 1),
+            ("errors", span.error is not None),
+            ("statements", span.statements),
+            ("rows", span.rows),
+            ("cache_hits", span.cache_hits),
+            ("cache_misses", span.cache_misses),
+        ):
+            counters[name][labels] = counters[name].get(labels, 0) + value
+
+    def _observe(self, name, labels, value):
+        histogram = self.histograms[name].get(labels)
+        if histogram is None:
+            histogram = self.histograms[name][labels] = {
+                "buckets": [0] * len(self.buckets),
+                "sum": 0.0,
+                "count": 0,
+            }
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, series in self.histograms.items():
+            metric = "{}_{}_seconds".format(self.namespace, name)
+            lines.append("# TYPE {} histogram".format(metric))
+            for labels, histogram in series.items():
+                label = _labels(labels)
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(
+                        '{}_bucket{{{},le="{}"}} {}'.format(
+                            metric, label, bound, count
+                        )
+                    )
+                lines.append(
+                    '{}_bucket{{{},le="+Inf"}} {}'.format(
+                        metric, label, histogram["count"]
+                    )
+                )
+                lines.append(
+                    "{}_sum{{{}}} {}".format(metric, label, histogram["sum"])
+                )
+                lines.append(
+                    "{}_count{{{}}} {}".format(
+                        metric, label, histogram["count"]
+                    )
+                )
+
+        for name, series in self.counters.items():
+            metric = "{}_{}_total".format(self.namespace, name)
+            lines.append("# TYPE {} counter".format(metric))
+            for labels, value in series.items():
+                lines.append(
+                    "{}{{{}}} {}".format(metric, _labels(labels), int(value))
+                )
+
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryInstrument(Instrument):
+    """Export each call as an OpenTelemetry span, child of the span current
+    when the call finishes, like the one of the request.
+
+    Needs the ``opentelemetry-api`` package, the tracer defaults to the
+    one of the global tracer provider.
+    """
+
+    def __init__(self, tracer=None) -> None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetryInstrument needs the opentelemetry-api package."
+            )
+
+        self._status = trace.Status
+        self._error = trace.StatusCode.ERROR
+        self.tracer = tracer or trace.get_tracer("service_repository")
+
+    def record(self, span: Span):
+        start = int(span.start * 1e9)
+        otel_span = self.tracer.start_span(
+            "{}.{}".format(span.service, span.operation), start_time=start
+        )
+        otel_span.set_attributes(
+            {
+                "service_repository.operation": span.operation,
+                "service_repository.service": span.service,
+                "service_repository.repository": span.repository,
+                "service_repository.db_time": span.db_time,
+                "service_repository.python_time": span.python_time,
+                "service_repository.statements": span.statements,
+                "service_repository.rows": span.rows,
+                "service_repository.cache_hits": span.cache_hits,
+                "service_repository.cache_misses": span.cache_misses,
+            }
+        )
+        if span.error is not None:
+            otel_span.set_status(self._status(self._error, span.error))
+        otel_span.end(end_time=start + int(span.wall_time * 1e9))
+
+
+def instrumented(method):
+    """Measure the calls of the service `method` in a :class:`Span`, given
+    to the ``instrument`` of the service, if any."""
+    operation = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        instrument = self.instrument
+        if instrument is None:
+            return await method(self, *args, **kwargs)
+
+        span, token = _start(self, operation)
+        try:
+            result = await method(self, *args, **kwargs)
+            span.rows = _count_rows(result)
+            return result
+        except Exception as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            _span.reset(token)
+            span.finish()
+            instrument.record(span)
+
+    return wrapper
+
+
+def instrumented_stream(method):
+    """Like :func:`instrumented`, for a service method returning an async
+    iterator. Without ``instrument`` the iterator is returned as it is."""
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrument is None:
+            return method(self, *args, **kwargs)
+        return _stream(self, operation, method(self, *args, **kwargs))
+
+    return wrapper
+
+
+async def _stream(service, operation, iterator):
+    instrument = service.instrument
+    span, token = _start(service, operation)
+    _span.reset(token)
+    try:
+        while True:
+            # The span is current only while the iterator runs, the code of
+            # the caller between the items is not measured.
+            token = _span.set(span)
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                _span.reset(token)
+            span.rows += 1
+            yield item
+    except Exception as exc:
+        span.error = type(exc).__name__
+        raise
+    finally:
+        span.finish()
+        instrument.record(span)
+
+
+def _start(service, operation):
+    if not _sqlalchemy_listening:
+        _listen_sqlalchemy()
+
+    span = Span(
+        operation,
+        type(service).__name__,
+        service.repository.__name__,
+        parent=_span.get(),
+    )
+    return span, _span.set(span)
+
+
+def _count_rows(result):
+    if result is None:
+        return 0
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        if "items" in result:
+            return len(result["items"])
+        return result.get("total", 1)
+    return 1
+
+
+def _labels(labels):
+    return 'service="{}",operation="{}"'.format(*labels)
+
+
+def _listen_sqlalchemy():
+    """Measure the statements of all the SQLAlchemy engines, the listeners
+    are added on the first span only."""
+    global _sqlalchemy_listening
+    _sqlalchemy_listening = True
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+    except ImportError:
+        return
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(*args):
+    span = _span.get()
+    if span is not None:
+        span.enter_db()
+
+
+def _after_cursor_execute(*args):
+    span = _span.get()
+    if span is not None:
+        span.exit_db()
+
+
+def _handle_error(context):
+    span = _span.get()
+    if span is not None and context.cursor is not None:
+        span.exit_db()
+
+
+class InstrumentedCollection(object):
+    """A Motor collection measuring its commands and cursors in `span`."""
+
+    def __init__(self, collection, span) -> None:
+        self._collection = collection
+        self._span = span
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in COMMAND_METHODS:
+            return functools.partial(_command, self._span, attribute)
+        if name in CURSOR_METHODS:
+            return functools.partial(_cursor, self._span, attribute)
+        return attribute
+
+
+async def _command(span, command, *args, **kwargs):
+    span.enter_db()
+    try:
+        return await command(*args, **kwargs)
+    finally:
+        span.exit_db()
+
+
+def _cursor(span, method, *args, **kwargs):
+    span.statements += 1
+    return InstrumentedCursor(method(*args, **kwargs), span)
+
+
+class InstrumentedCursor(object):
+    """A Motor cursor measuring the waits on its batches in `span`."""
+
+    def __init__(self, cursor, span) -> None:
+        self._cursor = cursor
+        self._span = span
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # Chained methods, like ``sort`` or ``limit``, return the cursor.
+            return self if result is self._cursor else result
+
+        return chained
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._span.enter_db()
+        try:
+            return await self._cursor.__anext__()
+        finally:
+            self._span.exit_db(statements=0)
+
+    async def to_list(self, length=None):
+        self._span.enter_db()
+        try:
+            return await self._cursor.to_list(length)
+        finally:
+            self._span.exit_db(statements=0)
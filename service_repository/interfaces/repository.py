@@ -24,6 +24,29 @@ class RepositoryInterface(metaclass=ABCMeta):
         raise NotImplementedError()
 
     @abstractmethod
-    async def delete(self, **kwargs):
-        """Delete one instance by filter."""
+    async def delete(
+        self, criteria: dict = None, returning: bool = False, **kwargs
+    ):
+        """Delete the instances matching the filter."""
         raise NotImplementedError()
+
+    def get_key_name(self):
+        """Return the name of the primary key, for the loader of the
+        service, `None` if it can not load by key."""
+
+    def snapshot(self, value):
+        """Return the result `value` of a read as kept by the cache of the
+        service, without ties to the ``db``."""
+        return value
+
+    async def restore(self, value):
+        """Return the result of a read from the cached `value` of
+        ``snapshot``, for one caller."""
+        return value
+
+    async def on_bind(self):
+        """Called once the repository is bound to its ``db`` by a service,
+        to warm and hold resources of the connection."""
+
+    async def close(self):
+        """Release the resources held since ``on_bind``."""
@@ -24,6 +24,8 @@ class ServiceInterface(metaclass=ABCMeta):
         raise NotImplementedError()
 
     @abstractmethod
-    async def delete(self, **kwargs):
-        """Delete one instance by filter."""
+    async def delete(
+        self, criteria: dict = None, returning: bool = False, **kwargs
+    ):
+        """Delete the instances matching the filter."""
         raise NotImplementedError()
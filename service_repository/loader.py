@@ -0,0 +1,103 @@
+import asyncio
+import contextvars
+
+_loaders = contextvars.ContextVar("service_repository_loaders", default=())
+
+
+def get_loader(service):
+    """Return the active :class:`Loader` of the repository and ``db`` of
+    `service`, or `None`."""
+    for loader in reversed(_loaders.get()):
+        if (
+            loader.service.repository is service.repository
+            and loader.service.db is service.db
+        ):
+            return loader
+
+
+class Loader(object):
+    """Coalesce the ``get`` by primary key of a service into ``get_many``.
+
+    The keys loaded in the same tick of the event loop, like by coroutines
+    gathered together, are fetched in a single query, each key once. The
+    results are kept for the life of the loader, a request, and dropped by
+    the writes of the services on the same repository and ``db``.
+
+    While active as a context manager, the calls to ``get`` with only the
+    primary key, of any service on the same repository and ``db``, go
+    through the loader.
+
+    Usage::
+
+        async with service.loader():
+            songs = await asyncio.gather(
+                *[SongService(db=session).get(id=id) for id in ids]
+            )
+    """
+
+    def __init__(self, service) -> None:
+        self.service = service
+        self.key = None
+        self._results = {}
+        self._queue = []
+        self._context = None
+        self._token = None
+
+    async def load(self, key):
+        """Return the instance of `key`, or `None` if missing."""
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._results[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch, context=self._context)
+            self._queue.append(key)
+        # Shielded, the cancel of a caller must not cancel the others.
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys):
+        """Return the instances of `keys`, in order, `None` if missing."""
+        return await asyncio.gather(*[self.load(key) for key in keys])
+
+    def clear(self, key=None):
+        """Drop the result of `key`, or all of them."""
+        if key is None:
+            self._results = {
+                key: future
+                for key, future in self._results.items()
+                if not future.done()
+            }
+        elif key in self._results and self._results[key].done():
+            del self._results[key]
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        asyncio.ensure_future(self._fetch(keys))
+
+    async def _fetch(self, keys):
+        futures = [self._results[key] for key in keys]
+        try:
+            instances = await self.service.get_many(keys)
+        except Exception as exc:
+            for key, future in zip(keys, futures):
+                if self._results.get(key) is future:
+                    del self._results[key]
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, instance in zip(futures, instances):
+            if not future.done():
+                future.set_result(instance)
+
+    async def __aenter__(self):
+        repository = await self.service.get_repository(read=True)
+        self.key = repository.get_key_name()
+        # The batches run in the context of the loader, not in the one of
+        # the first caller.
+        self._context = contextvars.copy_context()
+        self._token = _loaders.set(_loaders.get() + (self,))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _loaders.reset(self._token)
@@ -1,9 +1,41 @@
+import asyncio
+import logging
 import math
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
+from pymongo import ASCENDING, InsertOne, ReturnDocument, UpdateOne
 
+from service_repository.cache import MemoryCache, make_key
+from service_repository.cursor import (
+    CURSOR_NEXT,
+    CURSOR_PREV,
+    decode_cursor,
+    encode_cursor,
+)
+from service_repository.exceptions import InvalidCursor, InvalidPage
+from service_repository.filters.mongo import (
+    apply_mongo_filters,
+    apply_mongo_sort,
+    get_field_name,
+    get_index_warnings,
+)
+from service_repository.instrumentation import (
+    InstrumentedCollection,
+    current_span,
+)
 from service_repository.interfaces.repository import RepositoryInterface
+from service_repository.results import (
+    RESULT_COLUMNS,
+    RESULT_DICT,
+    RESULT_MODEL,
+    check_result_mode,
+    get_row_class,
+)
+from service_repository.unit_of_work import get_unit_of_work
+from service_repository.utils import chunks
+
+logger = logging.getLogger(__name__)
 
 
 class BaseRepositoryMotor(RepositoryInterface):
@@ -11,85 +43,720 @@ class BaseRepositoryMotor(RepositoryInterface):
 
     _model = None
     _collection = None
+    _collection_handle = None
+    count_cache = MemoryCache()
+    count_cache_ttl = 60
+    concurrent_count = True
+    batch_size = 1000
+    read_back = False
+    result_mode = RESULT_MODEL
+    index_warnings = True
+    index_cache = MemoryCache()
+    index_cache_ttl = 300
 
     def __init__(self, db: AsyncIOMotorDatabase) -> None:
         self.db: AsyncIOMotorDatabase = db
 
-    async def create(self, schema_in: dict):
-        """Create new object and returns the saved object instance."""
+    async def create(
+        self, schema_in: dict, read_back: bool = None, result_mode: str = None
+    ):
+        """Create new object and returns the saved object instance.
+
+        The instance is built from the inserted document and its
+        ``inserted_id``. With ``read_back`` (defaults to the ``read_back``
+        of the repository) it is read again from the server, to get values
+        set by the server. The ``result_mode`` of the repository does not
+        apply, a model is returned unless a ``result_mode`` is given.
+        """
+        if read_back is None:
+            read_back = self.read_back
+
         create_data = self.model(**schema_in).dict()
-        collection = self.db.get_collection(self.collection)
-        result = await collection.insert_one(create_data)
-        instance = await collection.find_one({"_id": result.inserted_id})
-        schema_out = self.model(**instance)
+        collection = self.get_collection()
+        result = await collection.insert_one(create_data, session=self.session)
+
+        if read_back:
+            instance = await collection.find_one(
+                {"_id": result.inserted_id}, session=self.session
+            )
+        else:
+            instance = dict(create_data, _id=result.inserted_id)
+
+        schema_out = self._to_result(instance, result_mode or RESULT_MODEL)
         return schema_out
 
-    async def update(self, instance: BaseModel, schema_in: dict):
+    async def update(
+        self, instance: BaseModel, schema_in: dict, result_mode: str = None
+    ):
         """Update a instance."""
         update_data = {
             "$set": schema_in,
             "$currentDate": {"updated_at": True},
         }
         criteria = {"_id": instance.id}
-        collection = self.db.get_collection(self.collection)
-        await collection.update_one(criteria, update_data)
-        instance = await collection.find_one(criteria)
-        schema_out = self.model(**instance)
+        collection = self.get_collection()
+        instance = await collection.find_one_and_update(
+            criteria,
+            update_data,
+            return_document=ReturnDocument.AFTER,
+            session=self.session,
+        )
+        schema_out = self._to_result(instance, result_mode or RESULT_MODEL)
         return schema_out
 
-    async def get(self, **kwargs):
-        """Get one instance by filter."""
-        collection = self.db.get_collection(self.collection)
-        instance = await collection.find_one(kwargs)
+    async def update_where(
+        self,
+        values: dict,
+        criteria: dict = None,
+        returning: bool = False,
+        **kwargs
+    ):
+        """Update the documents matching the filter with ``update_many``,
+        without fetching them.
+
+        The `values` are ``$set``, unless they are an update document with
+        operators like ``{"$inc": {"plays": 1}}``. Returns a dict with the
+        ``total`` of updated documents and, with `returning`, their
+        ``keys``.
+        """
+        query = self._filter(criteria, kwargs)
+        if not query:
+            raise ValueError("Update needs a filter.")
+
+        if any(key.startswith("$") for key in values):
+            update_data = dict(values)
+        else:
+            update_data = {"$set": values}
+        update_data.setdefault("$currentDate", {"updated_at": True})
+
+        collection = self.get_collection()
+        keys = None
+        if returning:
+            keys = [
+                (document["_id"],)
+                async for document in collection.find(
+                    query, {"_id": 1}, session=self.session
+                )
+            ]
+            query = {"_id": {"$in": [key for key, in keys]}}
+
+        result = await collection.update_many(
+            query, update_data, session=self.session
+        )
+        return {"total": result.modified_count, "keys": keys}
+
+    async def get(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        **kwargs
+    ):
+        """Get one instance by filter.
+
+        The kwargs are combined with the filter spec of ``criteria``, like
+        the one of ``paginate``. With ``fields`` only those fields (and
+        ``_id``) are fetched, and the instance is built without validation,
+        leaving the others unset.
+        """
+        projection = self._projection(fields)
+        collection = self.get_collection()
+        instance = await collection.find_one(
+            self._filter(criteria, kwargs), projection, session=self.session
+        )
         if instance:
-            schema_out = self.model(**instance)
+            schema_out = self._to_result(instance, result_mode, projection)
             return schema_out
 
-    async def delete(self, **kwargs):
-        """Delete one instance by filter."""
-        collection = self.db.get_collection(self.collection)
-        await collection.delete_one(kwargs)
+    async def get_many(
+        self, keys: list, fields: list = None, result_mode: str = None
+    ):
+        """Get the documents of the `keys` with ``{"_id": {"$in": keys}}``,
+        ``batch_size`` keys per query.
+
+        The instances are returned in the order of `keys`, with `None` for
+        the missing ones.
+        """
+        projection = self._projection(fields)
+        collection = self.get_collection()
+        keys = list(keys)
+        found = {}
+        for batch in chunks(dict.fromkeys(keys), self.batch_size):
+            async for document in collection.find(
+                {"_id": {"$in": batch}}, projection, session=self.session
+            ):
+                found[document["_id"]] = document
+
+        return [
+            self._to_result(found[key], result_mode, projection)
+            if key in found
+            else None
+            for key in keys
+        ]
+
+    def get_key_name(self):
+        """Return the name of the primary key, ``_id``."""
+        return "_id"
 
-    async def count(self, **kwargs):
-        """Count instances by filter."""
-        collection = self.db.get_collection(self.collection)
-        total = await collection.count_documents(kwargs)
+    async def delete(
+        self, criteria: dict = None, returning: bool = False, **kwargs
+    ):
+        """Delete all the documents matching the kwargs and the filter spec
+        of `criteria` with a single ``delete_many``.
+
+        Returns a dict with the ``total`` of deleted documents and, with
+        `returning`, their ``keys``. Raises ``ValueError`` without any
+        filter, use ``bulk_delete`` to delete all.
+        """
+        collection = self.get_collection()
+        query = self._filter(criteria, kwargs)
+        if not query:
+            raise ValueError(
+                "Delete needs a filter, use bulk_delete to delete all."
+            )
+
+        keys = None
+        if returning:
+            keys = [
+                (document["_id"],)
+                async for document in collection.find(
+                    query, {"_id": 1}, session=self.session
+                )
+            ]
+            query = {"_id": {"$in": [key for key, in keys]}}
+        result = await collection.delete_many(query, session=self.session)
+        return {"total": result.deleted_count, "keys": keys}
+
+    async def count(self, criteria: dict = None, **kwargs):
+        """Count instances by the kwargs and the filter spec of
+        ``criteria``."""
+        collection = self.get_collection()
+        total = await collection.count_documents(
+            self._filter(criteria, kwargs), session=self.session
+        )
         return total
 
-    async def all(self, **kwargs):
-        """Count instances by filter."""
-        collection = self.db.get_collection(self.collection)
-        total = await collection.count_documents(kwargs)
-        items = collection.find(kwargs)
-        instances = await items.to_list(total)
+    async def exists(self, criteria: dict = None, **kwargs):
+        """Whether any document matches the filter, with a ``find_one`` of
+        the ``_id`` only instead of counting."""
+        collection = self.get_collection()
+        document = await collection.find_one(
+            self._filter(criteria, kwargs), {"_id": 1}, session=self.session
+        )
+        return document is not None
+
+    async def all(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        sort: list = None,
+        limit: int = None,
+        **kwargs
+    ):
+        """Get all documents by filter, fetching only ``fields`` if given.
+
+        The kwargs are combined with the filter spec of ``criteria``, the
+        documents are ordered by the ``sort`` spec and at most ``limit`` are
+        returned. The documents are returned as they come unless a
+        ``result_mode`` is given.
+        """
+        projection = self._projection(fields)
+        collection = self.get_collection()
+        items = collection.find(
+            self._filter(criteria, kwargs),
+            projection,
+            sort=apply_mongo_sort(sort, self.model) or None,
+            limit=limit or 0,
+            session=self.session,
+        )
+        instances = await items.to_list(None)
+        if result_mode is not None:
+            instances = self._to_results(instances, result_mode, projection)
         return instances
 
+    async def stream(
+        self,
+        criteria: dict = {},
+        sort: list = [],
+        chunk_size: int = 1000,
+        raw: bool = False,
+        fields: list = None,
+        result_mode: str = None,
+    ):
+        """Iterate all instances by filter without loading them at once.
+
+        Documents are fetched from the cursor ``chunk_size`` at a time.
+        With ``raw`` the documents are yielded as they come, like the
+        ``dict`` result mode, skipping the model validation. With
+        ``fields`` only those fields are fetched.
+        """
+        result_mode = self._result_mode(RESULT_DICT if raw else result_mode)
+        criteria, sort = self._query(criteria, sort)
+        projection = self._projection(fields)
+        collection = self.get_collection()
+        items = collection.find(
+            criteria,
+            projection,
+            batch_size=chunk_size,
+            session=self.session,
+        )
+
+        if sort:
+            items = items.sort(sort)
+
+        async for item in items:
+            yield self._to_result(item, result_mode, projection)
+
     async def paginate(
         self,
         page: int = 1,
         per_page: int = 15,
         criteria: dict = {},
         sort: list = [],
+        mode: str = "offset",
+        cursor: str = None,
+        count_mode: str = "exact",
+        fields: list = None,
+        result_mode: str = None,
     ):
-        """Get collection of instances paginated by filter."""
-        collection = self.db.get_collection(self.collection)
-        total = await collection.count_documents(criteria)
-        items = collection.find(criteria)
+        """Get collection of instances paginated by filter.
 
-        if sort:
-            items = items.sort(sort)
+        With ``mode="offset"`` the page is selected by ``page``,
+        ``mode="facet"`` does the same but returns the items and the total
+        in a single ``$facet`` aggregation round trip, and
+        ``mode="keyset"`` seeks by ``cursor`` on the sort keys plus ``_id``,
+        taken from the ``next_cursor`` or ``prev_cursor`` of a previous
+        response.
+
+        The ``count_mode`` of the offset mode can be ``exact``,
+        ``estimated`` (``estimated_document_count`` when there is no
+        criteria), ``cached`` (an exact total reused for
+        ``count_cache_ttl`` seconds per criteria) or ``none``, which skips
+        the count and only tells ``has_next``. The facet mode always counts
+        and the keyset mode never counts. With ``concurrent_count`` enabled
+        the count and the page run at the same time.
+
+        The ``criteria`` and ``sort`` can be MongoDB ones or the filter and
+        sort specs of the SQLAlchemy repository, compiled to MongoDB.
+
+        With ``fields`` only those fields, ``_id`` and the sort keys are
+        fetched, and the instances are built without validation.
+        """
+        if per_page < 1:
+            raise InvalidPage(
+                "Page size should be positive: {}".format(per_page)
+            )
+
+        result_mode = self._result_mode(result_mode)
+        criteria, sort = self._query(criteria, sort)
+        await self._check_indexes(criteria, sort)
+        projection = self._projection(fields, sort)
+
+        if mode == "keyset":
+            return await self._paginate_keyset(
+                per_page, criteria, sort, cursor, projection, result_mode
+            )
+
+        if page < 1:
+            raise InvalidPage(
+                "Page number should be positive: {}".format(page)
+            )
+
+        skip = (page - 1) * per_page
+        collection = self.get_collection()
+
+        if mode == "offset":
+            # Without total fetch one extra document to know if there is a
+            # page after this one.
+            limit = per_page if count_mode != "none" else per_page + 1
+            items = collection.find(criteria, projection, session=self.session)
+
+            if sort:
+                items = items.sort(sort)
+
+            items = items.skip(skip).limit(limit).to_list(limit)
+            total = self._count_total(collection, criteria, count_mode)
+
+            # Operations of a session can not run at the same time.
+            if self.concurrent_count and self.session is None:
+                total, items = await asyncio.gather(total, items)
+            else:
+                total = await total
+                items = await items
+        elif mode == "facet":
+            pipeline = [{"$match": criteria}]
+
+            if sort:
+                pipeline.append({"$sort": dict(sort)})
+
+            stages = [{"$skip": skip}, {"$limit": per_page}]
+            if projection:
+                stages.append({"$project": projection})
 
-        items = await items.to_list(per_page)
+            pipeline.append(
+                {
+                    "$facet": {
+                        "items": stages,
+                        "total": [{"$count": "total"}],
+                    }
+                }
+            )
+            (result,) = await collection.aggregate(
+                pipeline, session=self.session
+            ).to_list(1)
+            items = result["items"]
+            total = result["total"][0]["total"] if result["total"] else 0
+        else:
+            raise ValueError("Pagination mode `{}` not valid.".format(mode))
+
+        if total is None:
+            num_pages = None
+            has_next = len(items) > per_page
+            items = items[:per_page]
+        else:
+            num_pages = int(math.ceil(total / per_page))
+            has_next = page < num_pages
 
         response = {
-            "items": [self.model(**item) for item in items],
+            "items": self._to_results(items, result_mode, projection),
             "per_page": per_page,
-            "num_pages": int(math.ceil(total / per_page)),
+            "num_pages": num_pages,
             "page": page,
             "total": total,
+            "has_next": has_next,
         }
         return response
 
+    async def _count_total(self, collection, criteria, count_mode):
+        if count_mode == "exact":
+            return await collection.count_documents(
+                criteria, session=self.session
+            )
+        elif count_mode == "estimated":
+            if not criteria:
+                return await collection.estimated_document_count()
+            return await collection.count_documents(
+                criteria, session=self.session
+            )
+        elif count_mode == "cached":
+            cache_key = make_key(
+                type(self).__module__,
+                type(self).__qualname__,
+                self._database_key(),
+                "count",
+                criteria,
+            )
+            total = await self.count_cache.get(cache_key)
+            if total is None:
+                total = await collection.count_documents(
+                    criteria, session=self.session
+                )
+                await self.count_cache.set(
+                    cache_key, total, ttl=self.count_cache_ttl
+                )
+            return total
+        elif count_mode != "none":
+            raise ValueError("Count mode `{}` not valid.".format(count_mode))
+
+    async def _paginate_keyset(
+        self,
+        per_page,
+        criteria,
+        sort,
+        cursor,
+        projection=None,
+        result_mode=RESULT_MODEL,
+    ):
+        keys = [(key, direction) for key, direction in sort or []]
+        if "_id" not in [key for key, _ in keys]:
+            keys.append(("_id", ASCENDING))
+
+        values, direction = None, CURSOR_NEXT
+        if cursor is not None:
+            values, direction = decode_cursor(cursor)
+            if len(values) != len(keys):
+                raise InvalidCursor(
+                    "Cursor `{}` does not match the sort.".format(cursor)
+                )
+
+        backwards = direction == CURSOR_PREV
+
+        if values is not None:
+            predicate = _keyset_predicate(keys, values, backwards)
+            criteria = (
+                {"$and": [criteria, predicate]} if criteria else predicate
+            )
+
+        # Fetch one extra document to know if there is a page after this one.
+        collection = self.get_collection()
+        items = collection.find(criteria, projection, session=self.session)
+        items = items.sort(
+            [(key, -order if backwards else order) for key, order in keys]
+        )
+        items = await items.limit(per_page + 1).to_list(per_page + 1)
+
+        has_more = len(items) > per_page
+        if has_more:
+            items = items[:per_page]
+
+        if backwards:
+            items.reverse()
+
+        # Walking backwards there is always the page the cursor came from.
+        has_next = True if backwards else has_more
+        has_prev = has_more if backwards else values is not None
+
+        next_cursor, prev_cursor = None, None
+        if items:
+            if has_next:
+                next_cursor = encode_cursor(
+                    [items[-1].get(key) for key, _ in keys], CURSOR_NEXT
+                )
+            if has_prev:
+                prev_cursor = encode_cursor(
+                    [items[0].get(key) for key, _ in keys], CURSOR_PREV
+                )
+        elif values is not None:
+            # Walked past the edge, allow to go back from the same boundary.
+            if backwards:
+                next_cursor = encode_cursor(values, CURSOR_NEXT)
+            else:
+                prev_cursor = encode_cursor(values, CURSOR_PREV)
+
+        response = {
+            "items": self._to_results(items, result_mode, projection),
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        }
+        return response
+
+    async def bulk_create(self, schemas_in: list, batch_size: int = None):
+        """Create many objects with one unordered ``insert_many`` per batch."""
+        collection = self.get_collection()
+        items, batches = [], []
+        for batch in chunks(schemas_in, batch_size or self.batch_size):
+            documents = [self.model(**schema_in).dict() for schema_in in batch]
+            result = await collection.insert_many(
+                documents, ordered=False, session=self.session
+            )
+            for document, inserted_id in zip(documents, result.inserted_ids):
+                document["_id"] = inserted_id
+                items.append(self.model(**document))
+            batches.append(len(result.inserted_ids))
+
+        return {"items": items, "batches": batches, "total": len(items)}
+
+    async def bulk_update(self, items: list, batch_size: int = None):
+        """Update many instances with one unordered ``bulk_write`` per batch.
+
+        :param items:
+            An iterable of ``(instance, schema_in)`` pairs, like the
+            arguments of ``update``.
+        """
+        collection = self.get_collection()
+        batches = []
+        for batch in chunks(items, batch_size or self.batch_size):
+            requests = [
+                UpdateOne(
+                    {"_id": instance.id},
+                    {
+                        "$set": schema_in,
+                        "$currentDate": {"updated_at": True},
+                    },
+                )
+                for instance, schema_in in batch
+            ]
+            result = await collection.bulk_write(
+                requests, ordered=False, session=self.session
+            )
+            batches.append(result.modified_count)
+
+        return {"batches": batches, "total": sum(batches)}
+
+    async def bulk_delete(self, criteria: dict = {}):
+        """Delete all the instances matching the filter at once."""
+        criteria, _ = self._query(criteria)
+        collection = self.get_collection()
+        result = await collection.delete_many(criteria, session=self.session)
+        return {
+            "batches": [result.deleted_count],
+            "total": result.deleted_count,
+        }
+
+    async def upsert_many(
+        self, schemas_in: list, keys: list = None, batch_size: int = None
+    ):
+        """Insert or update many objects with one unordered ``bulk_write``
+        of upserts per batch.
+
+        :param keys:
+            The fields identifying the existing documents, defaults to
+            ``_id``. The documents missing one of them are inserted.
+        """
+        keys = keys or ["_id"]
+        collection = self.get_collection()
+        batches = []
+        for batch in chunks(schemas_in, batch_size or self.batch_size):
+            requests = []
+            for schema_in in batch:
+                document = self.model(**schema_in).dict(by_alias=True)
+                if document.get("_id") is None:
+                    document.pop("_id", None)
+                if any(document.get(key) is None for key in keys):
+                    # Without its keys it can not match, an upsert on
+                    # {"_id": None} would store every new one in one record.
+                    requests.append(InsertOne(document))
+                    continue
+
+                values = {k: v for k, v in document.items() if k != "_id"}
+                requests.append(
+                    UpdateOne(
+                        {key: document[key] for key in keys},
+                        {"$set": values},
+                        upsert=True,
+                    )
+                )
+            result = await collection.bulk_write(
+                requests, ordered=False, session=self.session
+            )
+            batches.append(
+                result.inserted_count
+                + result.upserted_count
+                + result.modified_count
+            )
+
+        return {"batches": batches, "total": sum(batches)}
+
+    async def on_bind(self):
+        """Hold the collection handle of the bound database."""
+        self.get_collection()
+
+    async def close(self):
+        self._collection_handle = None
+
+    @property
+    def session(self):
+        """The session of the active unit of work of ``db``, if any."""
+        unit = get_unit_of_work(self.db)
+        return unit.session if unit is not None else None
+
+    def get_collection(self):
+        """Return the ``AsyncIOMotorCollection``, created once per
+        repository, measuring its commands in the span of the service call
+        when instrumented."""
+        if self._collection_handle is None:
+            self._collection_handle = self.db.get_collection(self.collection)
+
+        span = current_span()
+        if span is not None:
+            return InstrumentedCollection(self._collection_handle, span)
+        return self._collection_handle
+
+    def _projection(self, fields, sort=None):
+        """Return the projection of ``fields`` plus the keys of ``sort``."""
+        if not fields:
+            return None
+        projection = {get_field_name(self.model, field): 1 for field in fields}
+        for key, _ in sort or []:
+            projection[key] = 1
+        return projection
+
+    def _result_mode(self, result_mode):
+        return check_result_mode(result_mode or self.result_mode)
+
+    def _to_result(self, document, result_mode=None, projection=None):
+        (result,) = self._to_results([document], result_mode, projection)
+        return result
+
+    def _to_results(self, documents, result_mode=None, projection=None):
+        """Build the results of the documents in ``result_mode``, partial
+        documents are never validated."""
+        result_mode = self._result_mode(result_mode)
+        if result_mode == RESULT_DICT:
+            return documents
+
+        if result_mode == RESULT_MODEL and not projection:
+            return [self.model(**document) for document in documents]
+
+        fields = [
+            (name, field.alias)
+            for name, field in self.model.__fields__.items()
+            if projection is None
+            or field.alias in projection
+            or field.alias == "_id"
+        ]
+
+        if result_mode == RESULT_COLUMNS:
+            row_class = get_row_class(self.model, [name for name, _ in fields])
+            return [
+                row_class(*[document.get(alias) for _, alias in fields])
+                for document in documents
+            ]
+
+        # Built by field name, documents may also have keys not aliased.
+        return [
+            self.model.construct(
+                **{
+                    name: document[alias]
+                    for name, alias in fields
+                    if alias in document
+                }
+            )
+            for document in documents
+        ]
+
+    def _filter(self, criteria, kwargs):
+        """Return the query of the kwargs and the filter spec `criteria`."""
+        query = apply_mongo_filters(criteria, self.model) if criteria else {}
+        if not query:
+            return dict(kwargs)
+        if set(query) & set(kwargs):
+            return {"$and": [dict(kwargs), query]}
+        return dict(kwargs, **query)
+
+    def _query(self, criteria, sort=None):
+        """Compile the filter and sort specs into a MongoDB query and sort,
+        MongoDB queries and sorts are kept as they are."""
+        return (
+            apply_mongo_filters(criteria, self.model),
+            apply_mongo_sort(sort, self.model),
+        )
+
+    def _database_key(self):
+        """Key the class level caches apart for the repositories bound to
+        other databases, like tenants, or to other clients."""
+        return [id(self.db.client), self.db.name]
+
+    async def _check_indexes(self, criteria, sort):
+        """Warn, once per ``index_cache_ttl``, about filters and sorts that
+        can not use an index of the collection."""
+        if not self.index_warnings or not (criteria or sort):
+            return
+
+        cache_key = make_key(
+            type(self).__module__,
+            type(self).__qualname__,
+            self._database_key(),
+            "indexes",
+        )
+        indexes = await self.index_cache.get(cache_key)
+        if indexes is None:
+            collection = self.get_collection()
+            indexes = await collection.index_information()
+            await self.index_cache.set(
+                cache_key, indexes, ttl=self.index_cache_ttl
+            )
+
+        for message in get_index_warnings(indexes, criteria, sort):
+            warned_key = make_key(cache_key, message)
+            if await self.index_cache.get(warned_key) is None:
+                await self.index_cache.set(
+                    warned_key, True, ttl=self.index_cache_ttl
+                )
+                logger.warning("%s Collection `%s`.", message, self.collection)
+
     @property
     def model(self):
         if self._model is None:
@@ -109,3 +776,15 @@ class BaseRepositoryMotor(RepositoryInterface):
     @collection.setter
     def collection(self, value):
         self._collection = value
+
+
+def _keyset_predicate(keys, values, backwards):
+    """Expand the keyset into (k1 > v1) OR (k1 = v1 AND k2 > v2) ..."""
+    clauses = []
+    for index, (key, order) in enumerate(keys):
+        clause = {keys[i][0]: values[i] for i in range(index)}
+        ascending = (order == ASCENDING) != backwards
+        clause[key] = {"$gt" if ascending else "$lt": values[index]}
+        clauses.append(clause)
+
+    return {"$or": clauses}
@@ -1,14 +1,34 @@
 import logging
+from operator import attrgetter, itemgetter
 
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlalchemy import bindparam, delete, func, inspect, tuple_, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import load_only, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
+from service_repository.cache import MemoryCache, make_key
+from service_repository.exceptions import FieldNotFound
 from service_repository.filters.filters import apply_filters
-from service_repository.filters.pagination import apply_pagination
+from service_repository.filters.models import get_model_meta, get_statement
+from service_repository.filters.pagination import (
+    apply_keyset_pagination,
+    execute_pagination,
+)
 from service_repository.filters.sorting import apply_sort
+from service_repository.instrumentation import current_span
 from service_repository.interfaces.repository import RepositoryInterface
+from service_repository.results import (
+    RESULT_COLUMNS,
+    RESULT_CONSTRUCT,
+    RESULT_DICT,
+    RESULT_MODEL,
+    check_result_mode,
+)
+from service_repository.unit_of_work import get_unit_of_work
+from service_repository.utils import chunks
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +37,30 @@ class BaseRepositorySqlalchemy(RepositoryInterface):
     """Class representing the SQLAlchemy abstract repository."""
 
     _model = None
+    _schema = None
+    result_mode = RESULT_MODEL
     max_per_page = 25
+    count_cache = MemoryCache()
+    count_cache_ttl = 60
+    concurrent_count = False
+    batch_size = 1000
+    cache_statements = True
 
     def __init__(self, db: AsyncSession) -> None:
         self.db: AsyncSession = db
 
     async def create(self, schema_in: dict, autocommit: bool = True):
-        """Create new object and returns the saved object instance."""
+        """Create new object and returns the saved object instance.
+
+        In a unit of work the instance is flushed instead, to get its
+        primary key, and committed with the unit.
+        """
         instance = self.model(**schema_in)
         self.db.add(instance)
-        if autocommit:
-            await self.db.commit()
+        if autocommit and self.in_unit_of_work:
+            await self.db.flush()
+        elif autocommit:
+            await self._commit()
             await self.db.refresh(instance)
         return instance
 
@@ -35,96 +68,794 @@ class BaseRepositorySqlalchemy(RepositoryInterface):
         self, instance: BaseModel, schema_in: dict, autocommit: bool = True
     ):
         """Update a instance."""
-        data = instance.dict()
+        if instance not in self.db and inspect(instance).has_identity:
+            # An instance of another session, like a cached read, is copied
+            # in this one as loaded, so only the new values are written.
+            instance = await self.db.merge(instance, load=False)
 
-        for field in data:
-            if field in schema_in:
-                setattr(instance, field, schema_in[field])
+        fields = instance.__fields__
+        for field, value in schema_in.items():
+            if field in fields:
+                setattr(instance, field, value)
 
         if autocommit:
-            await self.db.commit()
+            await self._commit()
         return instance
 
-    async def get(self, **kwargs):
-        """Get one instance by filter."""
-        query = await self.db.execute(select(self.model).filter_by(**kwargs))
-        instance = query.scalar_one_or_none()
-        await self.db.commit()
+    async def update_where(
+        self,
+        values: dict,
+        criteria: dict = None,
+        returning: bool = False,
+        **kwargs
+    ):
+        """Update the rows matching the filter with a single ``UPDATE``,
+        without loading them.
+
+        :param values:
+            The new values by column name, they can also be SQL expressions
+            like ``{"plays": Song.plays + 1}``.
+
+        :param criteria:
+            A filter spec, like the one of ``paginate``, combined with the
+            ``filter_by`` kwargs.
+
+        :param returning:
+            Also return the primary keys of the updated rows, with
+            ``RETURNING`` where the database supports it, otherwise they
+            are selected first and updated by key in the same transaction.
+
+        :returns:
+            A dict with the ``total`` of updated rows and their ``keys``, a
+            list of primary key tuples, or `None` without ``returning``.
+
+        Instances of the updated rows already loaded in the session keep
+        their old values until refreshed.
+        """
+        where = self._where(criteria, kwargs)
+        if where is None:
+            raise ValueError("Update needs a filter.")
+
+        self._get_columns(values)
+        stmt = update(self.model.__table__).where(where).values(values)
+        total, keys = await self._execute_where(stmt, where, returning)
+        await self._commit()
+        return {"total": total, "keys": keys}
+
+    async def get(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        **kwargs
+    ):
+        """Get one instance by filter.
+
+        The ``filter_by`` kwargs are combined with the filter spec of
+        ``criteria``, like the one of ``paginate``. With ``fields`` only
+        those columns (and the primary key) are loaded, the other attributes
+        of the instance are left unloaded.
+        """
+        result_mode = self._result_mode(result_mode)
+        stmt, params = self._filtered(
+            ("get", self._fields_key(fields), result_mode),
+            lambda: self._select(fields, result_mode),
+            criteria,
+            kwargs,
+        )
+        query = await self.db.execute(stmt, params)
+        if result_mode == RESULT_MODEL:
+            instance = query.scalar_one_or_none()
+        else:
+            instance = query.one_or_none()
 
         if instance:
-            return instance
+            return self._to_result(instance, result_mode)
+
+    async def get_many(
+        self, keys: list, fields: list = None, result_mode: str = None
+    ):
+        """Get the instances of the primary `keys` with ``WHERE pk IN``,
+        ``batch_size`` keys per query.
+
+        The instances are returned in the order of `keys`, with `None` for
+        the missing ones. Composite primary keys are given as tuples.
+        """
+        result_mode = self._result_mode(result_mode)
+        primary_key = get_model_meta(self.model).primary_key_fields
+        names = [column.key for column in primary_key]
+        if fields and result_mode != RESULT_MODEL:
+            fields = list(fields) + [
+                name for name in names if name not in fields
+            ]
 
-    async def all(self, **kwargs):
-        """Get all instances by filter."""
-        query = await self.db.execute(select(self.model).filter_by(**kwargs))
-        instances = query.scalars().all()
-        await self.db.commit()
+        column = primary_key[0] if len(names) == 1 else tuple_(*primary_key)
+        stmt = self._statement(
+            ("get_many", self._fields_key(fields), result_mode),
+            lambda: self._select(fields, result_mode).where(
+                column.in_(bindparam("keys", expanding=True))
+            ),
+        )
+        # A single value, or a tuple for a composite primary key.
+        get_key, get_row_key = attrgetter(*names), itemgetter(*names)
+        # The keys as bound, like "1" and 1 or a UUID and its string, so
+        # the rows are found by the keys they matched.
+        normalize = self._key_normalizer(primary_key)
+
+        normalized = [normalize(key) for key in keys]
+        unique = {}
+        for key, original in zip(normalized, keys):
+            unique.setdefault(key, original)
+
+        found = {}
+        for batch in chunks(list(unique.values()), self.batch_size):
+            query = await self.db.execute(stmt, {"keys": batch})
+            if result_mode == RESULT_MODEL:
+                for instance in query.scalars():
+                    found[normalize(get_key(instance))] = instance
+            else:
+                for row in query:
+                    key = normalize(get_row_key(row._mapping))
+                    found[key] = self._to_result(row, result_mode)
+
+        return [found.get(key) for key in normalized]
+
+    def _key_normalizer(self, columns):
+        """Return a function giving a key of `columns`, a tuple for many,
+        as its columns bind it."""
+        dialect = self.db.bind.dialect if self.db.bind else None
+        processors = [_key_processor(column, dialect) for column in columns]
+        if len(processors) == 1:
+            return processors[0]
+        return lambda key: tuple(
+            process(value) for process, value in zip(processors, key)
+        )
+
+    def get_key_name(self):
+        """Return the name of the primary key, `None` if composite."""
+        primary_key = get_model_meta(self.model).primary_key_fields
+        if len(primary_key) == 1:
+            return primary_key[0].key
+
+    def snapshot(self, value):
+        """Return `value` with the instances of the model replaced by their
+        loaded column values, detached from the session that loaded them,
+        which can expire them on its next commit."""
+        if isinstance(value, self.model):
+            state = inspect(value)
+            return _Snapshot(
+                {
+                    attr.key: state.dict[attr.key]
+                    for attr in state.mapper.column_attrs
+                    if attr.key in state.dict
+                }
+            )
+        if isinstance(value, list):
+            return [self.snapshot(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.snapshot(item) for key, item in value.items()}
+        return value
+
+    async def restore(self, value):
+        """Return `value` of ``snapshot`` with new instances of the model,
+        merged in the session as loaded, without a query."""
+        if isinstance(value, _Snapshot):
+            instance = inspect(self.model).class_manager.new_instance()
+            for key, item in value.values.items():
+                set_committed_value(instance, key, item)
+            make_transient_to_detached(instance)
+            return await self.db.merge(instance, load=False)
+        if isinstance(value, list):
+            return [await self.restore(item) for item in value]
+        if isinstance(value, dict):
+            return {
+                key: await self.restore(item) for key, item in value.items()
+            }
+        return value
+
+    async def all(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        sort: list = None,
+        limit: int = None,
+        **kwargs
+    ):
+        """Get all instances by filter, loading only ``fields`` if given.
+
+        The ``filter_by`` kwargs are combined with the filter spec of
+        ``criteria``, the rows are ordered by the ``sort`` spec and at most
+        ``limit`` are returned.
+        """
+        result_mode = self._result_mode(result_mode)
+        stmt, params = self._filtered(
+            ("all", self._fields_key(fields), result_mode),
+            lambda: self._select(fields, result_mode),
+            criteria,
+            kwargs,
+        )
+        if sort:
+            stmt = apply_sort(stmt, sort)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        query = await self.db.execute(stmt, params)
+        if result_mode == RESULT_MODEL:
+            instances = query.scalars().all()
+        else:
+            instances = self._to_results(query.all(), result_mode)
         return instances
 
+    async def exists(self, criteria: dict = None, **kwargs):
+        """Whether any instance matches the filter, with a ``SELECT pk ...
+        LIMIT 1`` that stops at the first row instead of counting."""
+        stmt, params = self._filtered(
+            ("exists",),
+            lambda: select(
+                get_model_meta(self.model).primary_key_fields[0]
+            ).limit(1),
+            criteria,
+            kwargs,
+        )
+        query = await self.db.execute(stmt, params)
+        return query.first() is not None
+
+    async def stream(
+        self,
+        criteria: dict = {},
+        sort: list = [],
+        chunk_size: int = 1000,
+        raw: bool = False,
+        fields: list = None,
+        result_mode: str = None,
+    ):
+        """Iterate all instances by filter without loading them at once.
+
+        Rows are fetched from a server side cursor ``chunk_size`` at a time.
+        With ``raw`` the rows are yielded as dicts of the columns, like the
+        ``dict`` result mode, skipping the ORM hydration. With ``fields``
+        only those columns are selected.
+        """
+        result_mode = self._result_mode(RESULT_DICT if raw else result_mode)
+        stmt = self._select(fields, result_mode)
+
+        if criteria:
+            stmt = apply_filters(stmt, criteria)
+
+        if sort:
+            stmt = apply_sort(stmt, sort)
+
+        result = await self.db.stream(
+            stmt.execution_options(yield_per=chunk_size)
+        )
+        if result_mode == RESULT_MODEL:
+            result = result.scalars()
+
+        async for partition in result.partitions(chunk_size):
+            for row in self._to_results(partition, result_mode):
+                yield row
+
     async def paginate(
         self,
         page: int = 1,
         per_page: int = 15,
         criteria: dict = {},
         sort: list = [],
+        mode: str = "offset",
+        cursor: str = None,
+        count_mode: str = "exact",
+        fields: list = None,
+        result_mode: str = None,
     ):
-        """Get collection of instances paginated by filter."""
+        """Get collection of instances paginated by filter.
+
+        With ``fields`` only those columns, the primary key and the sort
+        keys are loaded.
+
+        With ``mode="offset"`` the page is selected by ``page``, with
+        ``mode="keyset"`` it is selected by ``cursor``, taken from the
+        ``next_cursor`` or ``prev_cursor`` of a previous response.
+
+        The ``count_mode`` of the offset mode can be ``exact``,
+        ``estimated``, ``cached`` (an exact total reused for
+        ``count_cache_ttl`` seconds per criteria) or ``none``, which skips
+        the count and only tells ``has_next``. The keyset mode never counts.
+
+        With ``concurrent_count`` enabled the count runs on another session
+        of the same engine at the same time as the page select, except in
+        a unit of work.
+        """
         if per_page == -1:
             per_page = None
         elif per_page > self.max_per_page:
             per_page = self.max_per_page
 
-        stmt = select(self.model)
+        result_mode = self._result_mode(result_mode)
+        if fields:
+            fields = list(fields) + [
+                column.key for column in get_model_meta(self.model).primary_key
+            ]
+            if sort:
+                fields += _get_sort_fields(self.model, sort)
+            # A column selected twice is a second column, like title_1.
+            fields = list(dict.fromkeys(fields))
+
+        stmt = self._select(fields, result_mode)
 
         if criteria:
             stmt = apply_filters(stmt, criteria)
 
+        if mode == "keyset":
+            return await self._paginate_keyset(
+                stmt, per_page, sort, cursor, result_mode
+            )
+        elif mode != "offset":
+            raise ValueError("Pagination mode `{}` not valid.".format(mode))
+
         if sort:
             stmt = apply_sort(stmt, sort)
 
-        stmt, pagination = await apply_pagination(
-            stmt,
-            session=self.db,
-            model=self.model,
-            page_number=page,
-            page_size=per_page,
-        )
+        total, cache_key = None, None
+        if count_mode == "cached":
+            cache_key = self._count_cache_key(criteria)
+            total = await self.count_cache.get(cache_key)
+            count_mode = "exact"
 
-        query = await self.db.execute(stmt)
-        await self.db.commit()
+        count_session = None
+        if (
+            self.concurrent_count
+            and self.db.bind is not None
+            and not self.in_unit_of_work
+        ):
+            # Another session would not see the changes of the unit.
+            count_session = AsyncSession(bind=self.db.bind)
+
+        try:
+            items, pagination = await execute_pagination(
+                stmt,
+                session=self.db,
+                model=self.model,
+                page_number=page,
+                page_size=per_page,
+                count_mode=count_mode,
+                total_results=total,
+                count_session=count_session,
+                scalars=result_mode == RESULT_MODEL,
+            )
+        finally:
+            if count_session is not None:
+                await count_session.close()
+
+        if cache_key is not None and total is None:
+            await self.count_cache.set(
+                cache_key, pagination.total_results, ttl=self.count_cache_ttl
+            )
 
         response = {
-            "items": query.scalars().all(),
+            "items": self._to_results(items, result_mode),
             "per_page": per_page,
             "num_pages": pagination.num_pages,
             "page": pagination.page_number,
             "total": pagination.total_results,
+            "has_next": pagination.has_next,
         }
 
         return response
 
-    async def delete(self, **kwargs):
-        """Delete one instance by filter."""
-        instance = await self.get(**kwargs)
-        await self.db.delete(instance)
-        await self.db.commit()
-
-    async def count(self, **kwargs):
-        """Count instances by filter."""
-        primary_key = getattr(
-            self.model,
-            self.model.__table__.primary_key.columns_autoinc_first[0].name,
+    async def _paginate_keyset(
+        self, stmt, per_page, sort, cursor, result_mode
+    ):
+        items, pagination = await apply_keyset_pagination(
+            stmt,
+            session=self.db,
+            model=self.model,
+            sort_spec=sort,
+            cursor=cursor,
+            page_size=per_page,
+            scalars=result_mode == RESULT_MODEL,
         )
 
-        stmt = select(self.model)
+        response = {
+            "items": self._to_results(items, result_mode),
+            "per_page": per_page,
+            "next_cursor": pagination.next_cursor,
+            "prev_cursor": pagination.prev_cursor,
+        }
+
+        return response
+
+    async def delete(
+        self, criteria: dict = None, returning: bool = False, **kwargs
+    ):
+        """Delete the rows matching the filter with a single ``DELETE``.
+
+        :param criteria:
+            A filter spec, like the one of ``paginate``, combined with the
+            ``filter_by`` kwargs.
 
-        count = await self.db.execute(
-            stmt.with_only_columns(func.count(primary_key)).filter_by(**kwargs)
+        :param returning:
+            Also return the primary keys of the deleted rows, with
+            ``RETURNING`` where the database supports it, otherwise they
+            are selected first and deleted by key in the same transaction.
+
+        :returns:
+            A dict with the ``total`` of deleted rows and their ``keys``, a
+            list of primary key tuples, or `None` without ``returning``.
+
+        Instances of the deleted rows already loaded in the session are not
+        removed from it.
+        """
+        where = self._where(criteria, kwargs)
+        if where is None:
+            raise ValueError(
+                "Delete needs a filter, use bulk_delete to delete all."
+            )
+
+        stmt = delete(self.model.__table__).where(where)
+        total, keys = await self._execute_where(stmt, where, returning)
+        await self._commit()
+        return {"total": total, "keys": keys}
+
+    async def count(self, criteria: dict = None, **kwargs):
+        """Count instances by the ``filter_by`` kwargs and the filter spec
+        of ``criteria``."""
+        primary_key = get_model_meta(self.model).primary_key_fields[0]
+
+        stmt, params = self._filtered(
+            ("count",),
+            lambda: select(self.model).with_only_columns(
+                func.count(primary_key)
+            ),
+            criteria,
+            kwargs,
         )
+        count = await self.db.execute(stmt, params)
 
         total = count.scalar_one()
         return total
 
+    async def bulk_create(self, schemas_in: list, batch_size: int = None):
+        """Create many objects, committing once per batch.
+
+        The instances of a batch are added at once, so the unit of work
+        emits them as a single executemany ``INSERT``. Unlike ``create``
+        the instances are not refreshed after the commit.
+        """
+        items, batches = [], []
+        for batch in chunks(schemas_in, batch_size or self.batch_size):
+            instances = [self.model(**schema_in) for schema_in in batch]
+            self.db.add_all(instances)
+            await self._commit()
+            items.extend(instances)
+            batches.append(len(instances))
+
+        return {"items": items, "batches": batches, "total": len(items)}
+
+    async def bulk_update(self, items: list, batch_size: int = None):
+        """Update many instances, committing once per batch.
+
+        :param items:
+            An iterable of ``(instance, schema_in)`` pairs, like the
+            arguments of ``update``.
+
+        Rows updating the same set of fields share one executemany
+        ``UPDATE ... WHERE pk = ?``. The instances get the new values
+        without being marked as modified.
+        """
+        table = self.model.__table__
+        primary_keys = get_model_meta(self.model).primary_key
+        updatable = set(table.columns.keys()) - {c.key for c in primary_keys}
+        batches = []
+        for batch in chunks(items, batch_size or self.batch_size):
+            groups, updated = {}, []
+            for instance, schema_in in batch:
+                values = {
+                    key: value
+                    for key, value in schema_in.items()
+                    if key in updatable
+                }
+                if not values:
+                    continue
+
+                params = {
+                    "_pk_" + c.key: getattr(instance, c.key)
+                    for c in primary_keys
+                }
+                params.update(values)
+                groups.setdefault(tuple(sorted(values)), []).append(params)
+                updated.append((instance, values))
+
+            total = 0
+            for params in groups.values():
+                # The SET clause is taken from the keys of the parameters.
+                stmt = update(table).where(
+                    *[c == bindparam("_pk_" + c.key) for c in primary_keys]
+                )
+                result = await self.db.execute(stmt, params)
+                total += result.rowcount
+
+            await self._commit()
+            batches.append(total)
+
+            for instance, values in updated:
+                for key, value in values.items():
+                    set_committed_value(instance, key, value)
+
+        return {"batches": batches, "total": sum(batches)}
+
+    async def bulk_delete(self, criteria: dict = {}):
+        """Delete all the instances matching the filter spec at once."""
+        stmt = delete(self.model.__table__)
+
+        if criteria:
+            stmt = stmt.where(
+                apply_filters(select(self.model), criteria).whereclause
+            )
+
+        result = await self.db.execute(stmt)
+        await self._commit()
+        return {"batches": [result.rowcount], "total": result.rowcount}
+
+    async def upsert_many(
+        self, schemas_in: list, keys: list = None, batch_size: int = None
+    ):
+        """Insert or update many objects, committing once per batch.
+
+        :param keys:
+            The unique columns identifying the existing rows, defaults to
+            the primary key.
+
+        Uses ``INSERT ... ON CONFLICT DO UPDATE`` on PostgreSQL and SQLite
+        and ``INSERT ... ON DUPLICATE KEY UPDATE`` on MySQL. Other
+        databases fall back to merge the instances by primary key.
+        """
+        table = self.model.__table__
+        primary_key = get_model_meta(self.model).primary_key
+        if keys is None:
+            keys = [c.key for c in primary_key]
+        # The primary key of an existing row is never rewritten, even when
+        # the rows are identified by other unique columns.
+        updated = [
+            c.key
+            for c in table.columns
+            if c.key not in keys and not c.primary_key
+        ]
+
+        dialect = self.db.bind.dialect.name if self.db.bind else None
+        batches = []
+        for batch in chunks(schemas_in, batch_size or self.batch_size):
+            # Rows without a primary key leave it to the database default,
+            # grouped by columns, a multi-row VALUES needs the same ones.
+            groups = {}
+            for schema_in in batch:
+                instance = self.model(**schema_in)
+                row = {
+                    c.key: getattr(instance, c.key)
+                    for c in table.columns
+                    if not (c.primary_key and getattr(instance, c.key) is None)
+                }
+                groups.setdefault(tuple(row), []).append(row)
+
+            total = 0
+            for rows in groups.values():
+                total += await self._upsert_rows(dialect, rows, keys, updated)
+
+            await self._commit()
+            batches.append(total)
+
+        return {"batches": batches, "total": sum(batches)}
+
+    async def _upsert_rows(self, dialect, rows, keys, updated):
+        table = self.model.__table__
+        if dialect in ("postgresql", "sqlite"):
+            dialect_insert = (
+                postgresql.insert if dialect == "postgresql" else sqlite.insert
+            )
+            stmt = dialect_insert(table).values(rows)
+            if updated:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=keys,
+                    set_={key: stmt.excluded[key] for key in updated},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+            result = await self.db.execute(stmt)
+            return result.rowcount
+
+        if dialect == "mysql":
+            stmt = mysql.insert(table).values(rows)
+            if updated:
+                stmt = stmt.on_duplicate_key_update(
+                    {key: stmt.inserted[key] for key in updated}
+                )
+            else:
+                stmt = stmt.prefix_with("IGNORE")
+            result = await self.db.execute(stmt)
+            return result.rowcount
+
+        for row in rows:
+            await self.db.merge(self.model(**row))
+        return len(rows)
+
+    @property
+    def in_unit_of_work(self):
+        return get_unit_of_work(self.db) is not None
+
+    async def _commit(self):
+        """Commit, unless in a unit of work, which commits once at exit."""
+        if self.in_unit_of_work:
+            return
+
+        span = current_span()
+        if span is None:
+            await self.db.commit()
+            return
+
+        # The flushed statements are counted by the engine events.
+        span.enter_db()
+        try:
+            await self.db.commit()
+        finally:
+            span.exit_db()
+
+    def _statement(self, key, build):
+        """Return the statement of `key`, built by ``build()`` once per
+        model, unless ``cache_statements`` is off."""
+        if not self.cache_statements:
+            return build()
+        return get_statement(self.model, key, build)
+
+    def _filtered(self, key, build, criteria, kwargs):
+        """Return the statement of `key` built by ``build()`` filtered by
+        the ``filter_by`` kwargs and the filter spec `criteria`, and its
+        parameters.
+
+        Filtered by the kwargs alone, the statement is built once per model
+        and names of the kwargs, with their values as bind parameters.
+        """
+        meta = get_model_meta(self.model)
+        if criteria or not meta.column_types.keys() >= kwargs.keys():
+            stmt = self._statement(key, build)
+            return self._filter(stmt, criteria, kwargs), None
+
+        names = tuple(sorted(kwargs))
+        # ``None`` is compared with ``IS NULL``, not with a parameter.
+        nulls = tuple(kwargs[name] is None for name in names)
+        stmt = self._statement(
+            key + (names, nulls),
+            lambda: build().filter_by(
+                **{
+                    name: None if null else bindparam("eq_" + name)
+                    for name, null in zip(names, nulls)
+                }
+            ),
+        )
+        params = {
+            "eq_" + name: kwargs[name]
+            for name, null in zip(names, nulls)
+            if not null
+        }
+        return stmt, params
+
+    def _filter(self, stmt, criteria, kwargs):
+        """Filter `stmt` by the ``filter_by`` kwargs and the filter spec
+        `criteria`."""
+        if kwargs:
+            stmt = stmt.filter_by(**kwargs)
+        if criteria:
+            stmt = apply_filters(stmt, criteria)
+        return stmt
+
+    def _where(self, criteria, kwargs):
+        """Return the WHERE clause of the ``filter_by`` kwargs and the
+        filter spec `criteria`, `None` without any filter."""
+        return self._filter(select(self.model), criteria, kwargs).whereclause
+
+    async def _execute_where(self, stmt, where, returning):
+        """Execute the ``UPDATE`` or ``DELETE`` `stmt` filtered by `where`,
+        returning the total of rows and, with `returning`, their keys."""
+        if not returning:
+            result = await self.db.execute(stmt)
+            return result.rowcount, None
+
+        primary_key = get_model_meta(self.model).primary_key
+        dialect = self.db.bind.dialect if self.db.bind else None
+        # SQLAlchemy 2 splits ``full_returning`` by statement.
+        supported = getattr(
+            dialect,
+            "{}_returning".format(stmt.__visit_name__),
+            getattr(dialect, "full_returning", False),
+        )
+        if supported:
+            result = await self.db.execute(stmt.returning(*primary_key))
+            keys = [tuple(row) for row in result]
+            return len(keys), keys
+
+        result = await self.db.execute(select(*primary_key).where(where))
+        keys = [tuple(row) for row in result]
+        if not keys:
+            return 0, keys
+
+        result = await self.db.execute(
+            stmt.where(tuple_(*primary_key).in_(keys))
+        )
+        return result.rowcount, keys
+
+    def _get_columns(self, fields):
+        meta = get_model_meta(self.model)
+        for field_name in fields:
+            if field_name not in meta.column_types:
+                raise FieldNotFound(
+                    "Model {} has no column `{}`.".format(
+                        self.model, field_name
+                    )
+                )
+        return [getattr(self.model, field_name) for field_name in fields]
+
+    @staticmethod
+    def _fields_key(fields):
+        return tuple(fields) if fields else None
+
+    def _select(self, fields, result_mode):
+        """Select the model, loading only the columns of ``fields`` (the
+        primary key is always loaded), or only the columns for the other
+        result modes. Built once per model, fields and result mode."""
+        return self._statement(
+            ("select", self._fields_key(fields), result_mode),
+            lambda: self._build_select(fields, result_mode),
+        )
+
+    def _build_select(self, fields, result_mode):
+        if result_mode == RESULT_MODEL:
+            stmt = select(self.model)
+            if fields:
+                stmt = stmt.options(load_only(*self._get_columns(fields)))
+            return stmt
+
+        if not fields:
+            fields = get_model_meta(self.model).column_types
+        return select(*self._get_columns(fields))
+
+    def _result_mode(self, result_mode):
+        return check_result_mode(result_mode or self.result_mode)
+
+    def _to_result(self, row, result_mode):
+        if result_mode == RESULT_CONSTRUCT:
+            return self.schema.construct(**row._mapping)
+        if result_mode == RESULT_DICT:
+            return dict(row._mapping)
+        return row
+
+    def _to_results(self, rows, result_mode):
+        if result_mode in (RESULT_MODEL, RESULT_COLUMNS):
+            return rows
+        return [self._to_result(row, result_mode) for row in rows]
+
+    def _count_cache_key(self, criteria):
+        # The class level cache is shared by the repositories bound to
+        # other databases, like tenants, keyed apart by their URL.
+        bind = self.db.bind
+        return make_key(
+            type(self).__module__,
+            type(self).__qualname__,
+            bind.url.render_as_string(hide_password=True) if bind else None,
+            "count",
+            criteria,
+        )
+
+    @property
+    def schema(self):
+        if self._schema is None:
+            raise ValueError(
+                "Schema is None, set the schema to use construct results"
+            )
+        return self._schema
+
+    @schema.setter
+    def schema(self, value):
+        self._schema = value
+
     @property
     def model(self):
         if self._model is None:
@@ -134,3 +865,51 @@ class BaseRepositorySqlalchemy(RepositoryInterface):
     @model.setter
     def model(self, value):
         self._model = value
+
+
+def _key_processor(column, dialect):
+    """Return a function converting a value of `column` as it is bound, or
+    to its python type, leaving the values it can not convert."""
+    process = None
+    if dialect is not None:
+        process = column.type.bind_processor(dialect)
+    if process is None:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return lambda value: value
+
+        def process(value):
+            if value is None or isinstance(value, python_type):
+                return value
+            return python_type(value)
+
+    def convert(value):
+        try:
+            return process(value)
+        except (TypeError, ValueError, AttributeError):
+            return value
+
+    return convert
+
+
+class _Snapshot(object):
+    """The loaded column values of a cached instance."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values):
+        self.values = values
+
+
+def _get_sort_fields(model, sort_spec):
+    """Return the column names of `model` in `sort_spec`."""
+    if isinstance(sort_spec, dict):
+        sort_spec = [sort_spec]
+    column_types = get_model_meta(model).column_types
+    return [
+        item["field"]
+        for item in sort_spec
+        if item.get("field") in column_types
+        and item.get("model", model.__name__) == model.__name__
+    ]
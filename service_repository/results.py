@@ -0,0 +1,38 @@
+from collections import namedtuple
+
+RESULT_MODEL = "model"
+RESULT_CONSTRUCT = "construct"
+RESULT_DICT = "dict"
+RESULT_COLUMNS = "columns"
+
+RESULT_MODES = (RESULT_MODEL, RESULT_CONSTRUCT, RESULT_DICT, RESULT_COLUMNS)
+"""
+How the repositories return the rows:
+
+- ``model``: validated model instances.
+- ``construct``: model instances built with ``construct``, no validation.
+- ``dict``: plain dicts.
+- ``columns``: tuples with the values accessible by name, like the rows of
+  SQLAlchemy.
+"""
+
+_row_classes = {}
+
+
+def check_result_mode(result_mode):
+    """Return `result_mode`, raising `ValueError` if it is not valid."""
+    if result_mode not in RESULT_MODES:
+        raise ValueError("Result mode `{}` not valid.".format(result_mode))
+    return result_mode
+
+
+def get_row_class(model, field_names):
+    """Return the namedtuple of the rows of `model` with `field_names`."""
+    key = (model, tuple(field_names))
+    try:
+        return _row_classes[key]
+    except KeyError:
+        row_class = _row_classes[key] = namedtuple(
+            "{}Row".format(model.__name__), field_names
+        )
+        return row_class
@@ -1,311 +1,909 @@
 import logging
+import random
+import time
+from contextvars import ContextVar
 
 from pydantic import BaseModel
 
+from service_repository.cache import (
+    CacheBackend,
+    generation_key,
+    get_or_set,
+    invalidate,
+    make_key,
+)
+from service_repository.instrumentation import (
+    Instrument,
+    current_span,
+    instrumented,
+    instrumented_stream,
+)
 from service_repository.interfaces.service import ServiceInterface
+from service_repository.loader import Loader, get_loader
+from service_repository.single_flight import SingleFlight
+from service_repository.unit_of_work import UnitOfWork, get_unit_of_work
 
 logger = logging.getLogger(__name__)
 
+_last_write = ContextVar("service_repository_last_write", default=None)
+
 
 class BaseService(ServiceInterface):
-    """Class representing the abstract service."""
+    """Class representing the abstract service.
+
+    Logging is lazy: nothing is built unless ``log_level`` is enabled for
+    the logger, and then only for a ``log_sample_rate`` fraction of the
+    calls (errors are always logged). The fields are passed as ``extra``
+    for structured handlers. The data and the instances are only dumped
+    with ``log_payloads``.
+
+    With a ``cache`` backend, ``get``, ``count`` and ``paginate`` are read
+    through it for ``cache_ttl`` seconds (defaults to the backend ttl), and
+    every write of the service invalidates the entries of its repository.
+    Cached instances are shared between callers, treat them as read only.
+
+    With a ``single_flight``, the identical ``get``, ``count``, ``exists``
+    and ``paginate`` running at the same time share one query and its
+    result, also read only, unless in a unit of work or after a write.
+
+    The repository is created once per service and ``db``, see
+    ``get_repository``. Reads (``get``, ``count``, ``all``, ``paginate``
+    and ``stream``) go to ``read_db`` when given, like a replica, and
+    stick to ``db`` for ``read_your_writes`` seconds after a write.
+
+    With an ``instrument``, see ``service_repository.instrumentation``,
+    each call is measured in a span: its wall and database times, the
+    statements issued, the rows returned and the cache hits.
+    """
 
     _repository = None
+    log_level = logging.INFO
+    log_sample_rate = 1.0
+    log_payloads = False
+    cache: CacheBackend = None
+    cache_ttl: float = None
+    single_flight: SingleFlight = None
+    instrument: Instrument = None
+    read_db = None
+    read_your_writes: float = 5.0
+    _bound_repository = None
+    _bound_read_repository = None
 
-    def __init__(self, db) -> None:
+    def __init__(self, db, read_db=None) -> None:
         self.db = db
+        self.read_db = read_db
+
+    async def get_repository(self, read: bool = False):
+        """Return the repository bound to the ``db`` of the service.
+
+        It is created and its ``on_bind`` awaited on first use, then reused
+        by every call of the service, until ``db`` changes or ``close``.
+
+        With ``read`` the repository is bound to ``read_db``, like a
+        replica, unless in a unit of work or in the ``read_your_writes``
+        seconds after a write of any service in the same context.
+        """
+        if read and self._use_read_db():
+            return await self._bind("_bound_read_repository", self.read_db)
+        return await self._bind("_bound_repository", self.db)
+
+    async def _bind(self, name, db):
+        repository = getattr(self, name)
+        if repository is None or repository.db is not db:
+            if repository is not None:
+                await repository.close()
+            repository = self.repository(db=db)
+            await repository.on_bind()
+            setattr(self, name, repository)
+        return repository
+
+    def _use_read_db(self):
+        return self.read_db is not None and self._can_share_reads()
 
+    def _can_share_reads(self):
+        """Whether the reads can see the changes of others, not in a unit
+        of work or in the ``read_your_writes`` seconds after a write."""
+        if get_unit_of_work(self.db) is not None:
+            return False
+        last_write = _last_write.get()
+        return (
+            last_write is None
+            or time.monotonic() - last_write >= self.read_your_writes
+        )
+
+    def unit_of_work(self):
+        """Return a :class:`UnitOfWork` on the ``db`` of the service, to
+        commit the calls of every service on it once, at exit."""
+        return UnitOfWork(self.db)
+
+    async def close(self):
+        """Close the bound repositories, releasing what they hold."""
+        for name in ("_bound_repository", "_bound_read_repository"):
+            repository = getattr(self, name)
+            setattr(self, name, None)
+            if repository is not None:
+                await repository.close()
+
+    @instrumented
     async def create(self, schema_in: BaseModel):
         """
         Create new entity and returns the saved entity instance.
         """
         create_data = schema_in.dict()
-        logger.info(
-            "Starting create model with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "create_data": create_data,
-                }
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting create model",
+                payload=lambda: {"create_data": create_data},
             )
-        )
         try:
-            instance = await self.repository(db=self.db).create(
-                schema_in=create_data
-            )
-            logger.info(
-                "Model created successfully with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
+            repository = await self.get_repository()
+            instance = await repository.create(schema_in=create_data)
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Model created successfully",
+                    payload=lambda: {
                         "create_data": create_data,
                         "schema_out": instance.dict(),
-                    }
+                    },
                 )
-            )
 
             return instance
         except Exception as exc:
-            logger.error(
-                "Error on create model with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "error": str(exc),
-                        "create_data": create_data,
-                    },
-                )
+            self._log(
+                "Error on create model",
+                level=logging.ERROR,
+                payload=lambda: {"create_data": create_data},
+                error=str(exc),
             )
             raise exc
 
+    @instrumented
     async def update(self, instance: BaseModel, schema_in: BaseModel):
         """Update a instance."""
         update_data = schema_in.dict(exclude_unset=True)
-        logger.info(
-            "Starting update model with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "id": getattr(instance, "id"),
-                    "update_data": update_data,
-                }
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting update model",
+                payload=lambda: {"update_data": update_data},
+                id=getattr(instance, "id"),
             )
-        )
         try:
-            instance = await self.repository(db=self.db).update(
+            repository = await self.get_repository()
+            instance = await repository.update(
                 instance=instance, schema_in=update_data
             )
-            logger.info(
-                "Model updated successfully with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "id": instance.id,
-                        "schema_out": instance.dict(),
-                    }
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Model updated successfully",
+                    payload=lambda: {"schema_out": instance.dict()},
+                    id=instance.id,
                 )
-            )
             return instance
         except Exception as exc:
-            logger.error(
-                "Error on update model with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "id": getattr(instance, "id"),
-                        "error": str(exc),
-                        "update_data": update_data,
-                    }
+            self._log(
+                "Error on update model",
+                level=logging.ERROR,
+                payload=lambda: {"update_data": update_data},
+                id=getattr(instance, "id"),
+                error=str(exc),
+            )
+            raise exc
+
+    @instrumented
+    async def update_where(
+        self,
+        values: dict,
+        criteria: dict = None,
+        returning: bool = False,
+        **kwargs
+    ):
+        """Update the instances matching the filter in a single statement,
+        without loading them, returns the ``total`` of updated rows and,
+        with `returning`, their primary ``keys``."""
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting update models",
+                payload=lambda: {"values": values},
+                criteria=criteria,
+                kwargs=kwargs,
+            )
+        try:
+            repository = await self.get_repository()
+            result = await repository.update_where(
+                values=values, criteria=criteria, returning=returning, **kwargs
+            )
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models updated successfully",
+                    criteria=criteria,
+                    kwargs=kwargs,
+                    total=result["total"],
                 )
+            return result
+        except Exception as exc:
+            self._log(
+                "Error on update models",
+                level=logging.ERROR,
+                payload=lambda: {"values": values},
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
             )
             raise exc
 
-    async def get(self, **kwargs):
-        """Get one instance by filter."""
-        logger.info(
-            "Starting get one model with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "kwargs": kwargs,
-                }
+    @instrumented
+    async def get(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        **kwargs
+    ):
+        """Get one instance by filter.
+
+        The kwargs are combined with the filter spec of ``criteria``. With
+        ``fields`` only those fields are read, returning a partial instance.
+        The ``result_mode`` can be ``model``, ``construct``, ``dict`` or
+        ``columns``, defaults to the one of the repository.
+        """
+        loader = get_loader(self)
+        if (
+            loader is not None
+            and fields is None
+            and result_mode is None
+            and criteria is None
+            and len(kwargs) == 1
+            and loader.key in kwargs
+        ):
+            return await loader.load(kwargs[loader.key])
+
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting get one model",
+                criteria=criteria,
+                kwargs=kwargs,
+                fields=fields,
             )
-        )
         try:
-            instance = await self.repository(db=self.db).get(**kwargs)
+            repository = await self.get_repository(read=True)
+            instance = await self._cached(
+                repository,
+                "get",
+                lambda: repository.get(
+                    fields=fields,
+                    result_mode=result_mode,
+                    criteria=criteria,
+                    **kwargs
+                ),
+                kwargs,
+                fields,
+                result_mode,
+                criteria,
+            )
             if instance:
-                logger.info(
-                    "Model got successfully with={}".format(
-                        {
-                            "service": type(self).__name__,
-                            "repository": self.repository.__name__,
-                            "kwargs": kwargs,
-                            "schema_out": instance.dict(),
-                        }
+                if log:
+                    self._log(
+                        "Model got successfully",
+                        payload=lambda: {"schema_out": _dump(instance)},
+                        criteria=criteria,
+                        kwargs=kwargs,
                     )
-                )
                 return instance
         except Exception as exc:
-            logger.error(
-                "Error on get one model with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "error": str(exc),
-                        "kwargs": kwargs,
-                    }
-                )
+            self._log(
+                "Error on get one model",
+                level=logging.ERROR,
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
             )
             raise exc
 
-    async def delete(self, **kwargs):
-        """Delete one instance by filter."""
-        logger.info(
-            "Starting delete one model with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "kwargs": kwargs,
-                }
+    @instrumented
+    async def get_many(
+        self, keys: list, fields: list = None, result_mode: str = None
+    ):
+        """Get the instances of the primary `keys` in a single query.
+
+        The instances are returned in the order of `keys`, with `None` for
+        the missing ones.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting get many models", keys=len(keys), fields=fields
             )
-        )
         try:
-            await self.repository(db=self.db).delete(**kwargs)
-            logger.info(
-                "Model deleted successfully with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "kwargs": kwargs,
-                    }
-                )
+            repository = await self.get_repository(read=True)
+            instances = await repository.get_many(
+                keys=keys, fields=fields, result_mode=result_mode
             )
-        except Exception as exc:
-            logger.error(
-                "Error on delete one model with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "error": str(exc),
-                        "kwargs": kwargs,
-                    }
+            if log:
+                self._log(
+                    "Models got successfully by keys",
+                    keys=len(keys),
+                    instances=sum(item is not None for item in instances),
                 )
+            return instances
+        except Exception as exc:
+            self._log(
+                "Error on get many models",
+                level=logging.ERROR,
+                keys=len(keys),
+                error=str(exc),
             )
             raise exc
 
-    async def count(self, **kwargs):
-        """Count instances by filter."""
-        logger.info(
-            "Starting count model with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "kwargs": kwargs,
-                }
+    def loader(self):
+        """Return a :class:`Loader`, batching the ``get`` by primary key of
+        concurrent coroutines into ``get_many``."""
+        return Loader(self)
+
+    @instrumented
+    async def delete(
+        self, criteria: dict = None, returning: bool = False, **kwargs
+    ):
+        """Delete the instances matching the filter, returns the ``total``
+        of deleted rows and, with `returning`, their primary ``keys``."""
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting delete models", criteria=criteria, kwargs=kwargs
             )
-        )
         try:
-            total = await self.repository(db=self.db).count(**kwargs)
-            logger.info(
-                "Models counted successfully with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "kwargs": kwargs,
-                        "total": total,
-                    }
+            repository = await self.get_repository()
+            result = await repository.delete(
+                criteria=criteria, returning=returning, **kwargs
+            )
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models deleted successfully",
+                    criteria=criteria,
+                    kwargs=kwargs,
+                    total=result["total"],
                 )
+            return result
+        except Exception as exc:
+            self._log(
+                "Error on delete models",
+                level=logging.ERROR,
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
             )
+            raise exc
+
+    @instrumented
+    async def count(self, criteria: dict = None, **kwargs):
+        """Count instances by the kwargs and the filter spec of
+        ``criteria``."""
+        log = self._should_log()
+        if log:
+            self._log("Starting count model", criteria=criteria, kwargs=kwargs)
+        try:
+            repository = await self.get_repository(read=True)
+            total = await self._cached(
+                repository,
+                "count",
+                lambda: repository.count(criteria=criteria, **kwargs),
+                kwargs,
+                criteria,
+            )
+            if log:
+                self._log(
+                    "Models counted successfully",
+                    criteria=criteria,
+                    kwargs=kwargs,
+                    total=total,
+                )
             return total
         except Exception as exc:
-            logger.error(
-                "Error on count model with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "error": str(exc),
-                        "kwargs": kwargs,
-                    }
+            self._log(
+                "Error on count model",
+                level=logging.ERROR,
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
+            )
+            raise exc
+
+    @instrumented
+    async def exists(self, criteria: dict = None, **kwargs):
+        """Whether any instance matches the kwargs and the filter spec of
+        ``criteria``, cheaper than a ``count``."""
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting exists model", criteria=criteria, kwargs=kwargs
+            )
+        try:
+            repository = await self.get_repository(read=True)
+            exists = await self._cached(
+                repository,
+                "exists",
+                lambda: repository.exists(criteria=criteria, **kwargs),
+                kwargs,
+                criteria,
+            )
+            if log:
+                self._log(
+                    "Models checked successfully",
+                    criteria=criteria,
+                    kwargs=kwargs,
+                    exists=exists,
                 )
+            return exists
+        except Exception as exc:
+            self._log(
+                "Error on exists model",
+                level=logging.ERROR,
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
             )
             raise exc
 
+    @instrumented
     async def paginate(
         self,
         page: int = 1,
         per_page: int = 15,
         criteria: dict = {},
         sort: list = None,
+        mode: str = "offset",
+        cursor: str = None,
+        count_mode: str = "exact",
+        fields: list = None,
+        result_mode: str = None,
     ):
-        """Get collection of instances paginated by filter."""
-        logger.info(
-            "Starting paginate models with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "criteria": criteria,
-                    "sort": sort,
-                    "page": page,
-                    "per_page": per_page,
-                }
+        """Get collection of instances paginated by filter.
+
+        Use ``mode="keyset"`` and the returned ``next_cursor`` or
+        ``prev_cursor`` as ``cursor`` to walk deep pages at constant cost.
+        Use ``count_mode`` ``none``, ``estimated`` or ``cached`` to avoid
+        paying an exact count on every page. Use ``fields`` to read only
+        the fields shown and ``result_mode`` to skip building models.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting paginate models",
+                criteria=criteria,
+                sort=sort,
+                page=page,
+                per_page=per_page,
+                mode=mode,
+                cursor=cursor,
+                count_mode=count_mode,
+                fields=fields,
             )
-        )
         try:
-            pagination = await self.repository(db=self.db).paginate(
+            repository = await self.get_repository(read=True)
+            pagination = await self._cached(
+                repository,
+                "paginate",
+                lambda: repository.paginate(
+                    page=page,
+                    per_page=per_page,
+                    criteria=criteria,
+                    sort=sort,
+                    mode=mode,
+                    cursor=cursor,
+                    count_mode=count_mode,
+                    fields=fields,
+                    result_mode=result_mode,
+                ),
+                page,
+                per_page,
+                criteria,
+                sort,
+                mode,
+                cursor,
+                count_mode,
+                fields,
+                result_mode,
+            )
+            if log:
+                self._log(
+                    "Models paginate successfully",
+                    criteria=criteria,
+                    sort=sort,
+                    items=len(pagination["items"]),
+                    per_page=pagination["per_page"],
+                    num_pages=pagination.get("num_pages"),
+                    page=pagination.get("page"),
+                    total=pagination.get("total"),
+                    has_next=pagination.get("has_next"),
+                    next_cursor=pagination.get("next_cursor"),
+                )
+            return pagination
+        except Exception as exc:
+            self._log(
+                "Error on paginate models",
+                level=logging.ERROR,
+                error=str(exc),
+                criteria=criteria,
+                sort=sort,
                 page=page,
                 per_page=per_page,
+                mode=mode,
+                cursor=cursor,
+                count_mode=count_mode,
+            )
+            raise exc
+
+    @instrumented_stream
+    async def stream(
+        self,
+        criteria: dict = {},
+        sort: list = None,
+        chunk_size: int = 1000,
+        raw: bool = False,
+        fields: list = None,
+        result_mode: str = None,
+    ):
+        """Iterate all instances by filter, fetching ``chunk_size`` at once.
+
+        With ``raw`` the rows are yielded without building model instances.
+        With ``fields`` only those fields are read.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting stream models",
                 criteria=criteria,
                 sort=sort,
+                chunk_size=chunk_size,
             )
-            logger.info(
-                "Models paginate successfully with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "criteria": criteria,
-                        "sort": sort,
-                        "items": len(pagination["items"]),
-                        "per_page": pagination["per_page"],
-                        "num_pages": pagination["num_pages"],
-                        "page": pagination["page"],
-                        "total": pagination["total"],
-                    }
-                )
+        total = 0
+        try:
+            repository = await self.get_repository(read=True)
+            async for item in repository.stream(
+                criteria=criteria,
+                sort=sort,
+                chunk_size=chunk_size,
+                raw=raw,
+                fields=fields,
+                result_mode=result_mode,
+            ):
+                total += 1
+                yield item
+        except Exception as exc:
+            self._log(
+                "Error on stream models",
+                level=logging.ERROR,
+                error=str(exc),
+                criteria=criteria,
+                sort=sort,
+                total=total,
             )
-            return pagination
+            raise exc
+
+        if log:
+            self._log(
+                "Models streamed successfully",
+                criteria=criteria,
+                sort=sort,
+                total=total,
+            )
+
+    @instrumented
+    async def all(
+        self,
+        fields: list = None,
+        result_mode: str = None,
+        criteria: dict = None,
+        sort: list = None,
+        limit: int = None,
+        **kwargs
+    ):
+        """Get all instances by filter, reading only ``fields`` if given.
+
+        The kwargs are combined with the filter spec of ``criteria``, the
+        instances are ordered by the ``sort`` spec and at most ``limit`` are
+        returned.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting get models by filter",
+                criteria=criteria,
+                sort=sort,
+                limit=limit,
+                kwargs=kwargs,
+                fields=fields,
+            )
+        try:
+            repository = await self.get_repository(read=True)
+            instances = await repository.all(
+                fields=fields,
+                result_mode=result_mode,
+                criteria=criteria,
+                sort=sort,
+                limit=limit,
+                **kwargs
+            )
+            if log:
+                self._log(
+                    "Models got successfully by filter",
+                    criteria=criteria,
+                    kwargs=kwargs,
+                    instances=len(instances),
+                )
+            return instances
         except Exception as exc:
-            logger.error(
-                "Error on paginate models with={}".format(
-                    {
-                        "error": str(exc),
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "criteria": criteria,
-                        "sort": sort,
-                        "page": page,
-                        "per_page": per_page,
-                    }
+            self._log(
+                "Error on get models by filter",
+                level=logging.ERROR,
+                criteria=criteria,
+                kwargs=kwargs,
+                error=str(exc),
+            )
+            raise exc
+
+    @instrumented
+    async def bulk_create(self, schemas_in: list, batch_size: int = None):
+        """
+        Create many entities, committing once per batch.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting bulk create models",
+                count=len(schemas_in),
+                batch_size=batch_size,
+            )
+        try:
+            repository = await self.get_repository()
+            result = await repository.bulk_create(
+                schemas_in=[schema_in.dict() for schema_in in schemas_in],
+                batch_size=batch_size,
+            )
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models bulk created successfully",
+                    batches=result["batches"],
+                    total=result["total"],
                 )
+            return result
+        except Exception as exc:
+            # Batches committed before the error are also invalidated.
+            await self._invalidate()
+            self._log(
+                "Error on bulk create models",
+                level=logging.ERROR,
+                error=str(exc),
+                count=len(schemas_in),
             )
             raise exc
 
-    async def all(self, **kwargs):
-        """Get all instances by filter."""
-        logger.info(
-            "Starting get models by filter with={}".format(
-                {
-                    "service": type(self).__name__,
-                    "repository": self.repository.__name__,
-                    "kwargs": kwargs,
-                }
+    @instrumented
+    async def bulk_update(self, items: list, batch_size: int = None):
+        """Update many instances, committing once per batch.
+
+        :param items:
+            A list of ``(instance, schema_in)`` pairs, like the arguments
+            of ``update``.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting bulk update models",
+                count=len(items),
+                batch_size=batch_size,
             )
-        )
         try:
-            instances = await self.repository(db=self.db).all(**kwargs)
-            logger.info(
-                "Models got successfully by filter with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "kwargs": kwargs,
-                        "instances": len(instances),
-                    }
+            repository = await self.get_repository()
+            result = await repository.bulk_update(
+                items=[
+                    (instance, schema_in.dict(exclude_unset=True))
+                    for instance, schema_in in items
+                ],
+                batch_size=batch_size,
+            )
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models bulk updated successfully",
+                    batches=result["batches"],
+                    total=result["total"],
                 )
+            return result
+        except Exception as exc:
+            # Batches committed before the error are also invalidated.
+            await self._invalidate()
+            self._log(
+                "Error on bulk update models",
+                level=logging.ERROR,
+                error=str(exc),
+                count=len(items),
             )
-            return instances
+            raise exc
+
+    @instrumented
+    async def bulk_delete(self, criteria: dict = {}):
+        """Delete all instances by filter."""
+        log = self._should_log()
+        if log:
+            self._log("Starting bulk delete models", criteria=criteria)
+        try:
+            repository = await self.get_repository()
+            result = await repository.bulk_delete(criteria=criteria)
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models bulk deleted successfully",
+                    criteria=criteria,
+                    total=result["total"],
+                )
+            return result
         except Exception as exc:
-            logger.error(
-                "Error on get models by filter with={}".format(
-                    {
-                        "service": type(self).__name__,
-                        "repository": self.repository.__name__,
-                        "error": str(exc),
-                        "kwargs": kwargs,
-                    }
+            self._log(
+                "Error on bulk delete models",
+                level=logging.ERROR,
+                error=str(exc),
+                criteria=criteria,
+            )
+            raise exc
+
+    @instrumented
+    async def upsert_many(
+        self, schemas_in: list, keys: list = None, batch_size: int = None
+    ):
+        """
+        Insert or update many entities by unique keys, committing once per
+        batch.
+        """
+        log = self._should_log()
+        if log:
+            self._log(
+                "Starting upsert models",
+                count=len(schemas_in),
+                keys=keys,
+                batch_size=batch_size,
+            )
+        try:
+            repository = await self.get_repository()
+            result = await repository.upsert_many(
+                schemas_in=[
+                    schema_in.dict(by_alias=True) for schema_in in schemas_in
+                ],
+                keys=keys,
+                batch_size=batch_size,
+            )
+            await self._invalidate()
+            if log:
+                self._log(
+                    "Models upserted successfully",
+                    batches=result["batches"],
+                    total=result["total"],
                 )
+            return result
+        except Exception as exc:
+            # Batches committed before the error are also invalidated.
+            await self._invalidate()
+            self._log(
+                "Error on upsert models",
+                level=logging.ERROR,
+                error=str(exc),
+                count=len(schemas_in),
+                keys=keys,
             )
             raise exc
 
+    async def _cached(self, repository, method, factory, *params):
+        """Read `method` through the single flight and the cache, keyed by
+        its `params`.
+
+        The result is shared as the ``snapshot`` of `repository`, and each
+        caller gets its own ``restore`` of it.
+        """
+        if get_unit_of_work(self.db) is not None or (
+            self.cache is None and self.single_flight is None
+        ):
+            # The reads of a unit see its uncommitted changes, they are not
+            # shared, nor cached.
+            return await factory()
+
+        async def snapshot():
+            return repository.snapshot(await factory())
+
+        if self.single_flight is None or not self._can_share_reads():
+            value = await self._read_through(method, snapshot, params)
+        else:
+            value = await self.single_flight.do(
+                self._cache_namespace(),
+                make_key(method, *params),
+                lambda: self._read_through(method, snapshot, params),
+            )
+        return await repository.restore(value)
+
+    async def _read_through(self, method, factory, params):
+        if self.cache is None:
+            return await factory()
+
+        key = await generation_key(
+            self.cache, self._cache_namespace(), method, *params
+        )
+        span = current_span()
+        if span is None:
+            return await get_or_set(
+                self.cache, key, factory, ttl=self.cache_ttl
+            )
+
+        misses = self.cache.misses
+        value = await get_or_set(self.cache, key, factory, ttl=self.cache_ttl)
+        if self.cache.misses == misses:
+            span.cache_hits += 1
+        else:
+            span.cache_misses += 1
+        return value
+
+    async def _invalidate(self):
+        """Invalidate the cached reads of the repository after a write and
+        stick the reads of the context to ``db``.
+
+        In a unit of work it is invalidated again after the commit or the
+        rollback, so reads cached before the end of the unit are dropped
+        too.
+        """
+        _last_write.set(time.monotonic())
+        loader = get_loader(self)
+        if loader is not None:
+            loader.clear()
+        if self.single_flight is not None:
+            self.single_flight.forget(self._cache_namespace())
+        if self.cache is not None:
+            await invalidate(self.cache, self._cache_namespace())
+
+            unit = get_unit_of_work(self.db)
+            if unit is not None:
+                unit.after_commit(self._invalidate)
+                unit.after_rollback(self._invalidate)
+
+    def _cache_namespace(self):
+        return "{}.{}".format(
+            self.repository.__module__, self.repository.__qualname__
+        )
+
+    def _should_log(self):
+        """Tell if the current call is logged, checked once per call."""
+        if not logger.isEnabledFor(self.log_level):
+            return False
+        return self.log_sample_rate >= 1 or (
+            random.random() < self.log_sample_rate  # nosec
+        )
+
+    def _log(self, message, level=None, payload=None, **fields):
+        """Log `message` with `fields` as lazy args and structured extra.
+
+        :param payload:
+            A callable returning the dumps of the data, only called with
+            ``log_payloads``.
+        """
+        level = self.log_level if level is None else level
+        if not logger.isEnabledFor(level):
+            return
+
+        fields = {
+            "service": type(self).__name__,
+            "repository": self.repository.__name__,
+            **fields,
+        }
+        if payload is not None and self.log_payloads:
+            fields.update(payload())
+
+        logger.log(level, "%s with=%s", message, fields, extra=fields)
+
     @property
     def repository(self):
         if self._repository is None:
@@ -315,3 +913,12 @@ class BaseService(ServiceInterface):
     @repository.setter
     def repository(self, value):
         self._repository = value
+
+
+def _dump(instance):
+    """Return the data of an instance of any result mode."""
+    if isinstance(instance, BaseModel):
+        return instance.dict()
+    if hasattr(instance, "_asdict"):
+        return instance._asdict()
+    return dict(instance)
@@ -0,0 +1,45 @@
+import asyncio
+import functools
+
+
+class SingleFlight(object):
+    """Share one in-flight call between the identical concurrent calls.
+
+    The first call of a key runs, the calls of the same key arriving
+    before it completes await its result, or its error, instead of running
+    again. Nothing is kept after completion, unlike a cache.
+
+    The call runs in a task of its own, so the cancel of a caller does not
+    cancel the others. ``shared`` counts the calls that joined a flight.
+    """
+
+    def __init__(self) -> None:
+        self.shared = 0
+        self._flights = {}
+
+    async def do(self, namespace, key, factory):
+        """Await ``factory()``, or the flight of `key` in `namespace`."""
+        flights = self._flights.setdefault(namespace, {})
+        task = flights.get(key)
+        if task is None:
+            task = flights[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(functools.partial(self._done, flights, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def forget(self, namespace):
+        """Let the next calls in `namespace` start new flights, like after
+        a write, the running ones still complete for their callers."""
+        self._flights.pop(namespace, None)
+
+    def __len__(self):
+        return sum(len(flights) for flights in self._flights.values())
+
+    @staticmethod
+    def _done(flights, key, task):
+        if flights.get(key) is task:
+            del flights[key]
+        if not task.cancelled():
+            # Retrieved, even when all the callers were cancelled.
+            task.exception()
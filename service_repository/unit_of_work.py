@@ -0,0 +1,98 @@
+from contextvars import ContextVar
+
+_units = ContextVar("service_repository_units", default=())
+
+
+def get_unit_of_work(db):
+    """Return the active :class:`UnitOfWork` of `db`, or `None`."""
+    for unit in reversed(_units.get()):
+        if unit.db is db:
+            return unit
+
+
+class UnitOfWork(object):
+    """Run the calls of the services on `db` in a single transaction.
+
+    While active, the repositories on the same `db`, of any service, do not
+    commit after each call: the SQLAlchemy session flushes when needed and
+    the MongoDB operations run in a session with a transaction. At exit the
+    transaction is committed once, or rolled back on error.
+
+    Units on the same `db` can be nested, the inner ones join the outermost,
+    which is the only one to commit.
+
+    Usage::
+
+        async with service.unit_of_work():
+            song = await service.create(schema_in=song_in)
+            await other_service.update(instance=other, schema_in=other_in)
+    """
+
+    def __init__(self, db) -> None:
+        self.db = db
+        self.session = None
+        self._outer = None
+        self._token = None
+        self._after_commit = []
+        self._after_rollback = []
+
+    def after_commit(self, callback):
+        """Await `callback()` after the commit, like a cache invalidation
+        that must not run before the changes are visible."""
+        if self._outer is not None:
+            self._outer.after_commit(callback)
+        elif callback not in self._after_commit:
+            self._after_commit.append(callback)
+
+    def after_rollback(self, callback):
+        """Await `callback()` after the rollback, like a cache invalidation
+        of the reads that saw the discarded changes."""
+        if self._outer is not None:
+            self._outer.after_rollback(callback)
+        elif callback not in self._after_rollback:
+            self._after_rollback.append(callback)
+
+    async def __aenter__(self):
+        self._outer = get_unit_of_work(self.db)
+        if self._outer is not None:
+            self.session = self._outer.session
+        elif not hasattr(type(self.db), "commit"):
+            # A MongoDB database, the operations need a session. Checked on
+            # the class, a Motor database gives any attribute as collection.
+            self.session = await self.db.client.start_session()
+            self.session.start_transaction()
+
+        self._token = _units.set(_units.get() + (self,))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _units.reset(self._token)
+        if self._outer is not None:
+            return
+
+        try:
+            if exc_type is None:
+                await self._commit()
+            else:
+                await self._rollback()
+        finally:
+            if self.session is not None:
+                await self.session.end_session()
+
+        callbacks = (
+            self._after_commit if exc_type is None else self._after_rollback
+        )
+        for callback in callbacks:
+            await callback()
+
+    async def _commit(self):
+        if self.session is not None:
+            await self.session.commit_transaction()
+        else:
+            await self.db.commit()
+
+    async def _rollback(self):
+        if self.session is not None:
+            await self.session.abort_transaction()
+        else:
+            await self.db.rollback()
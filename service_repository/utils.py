@@ -0,0 +1,14 @@
+from itertools import islice
+
+
+def chunks(iterable, size: int):
+    """Split `iterable` in lists of at most `size` items."""
+    if size < 1:
+        raise ValueError("Batch size should be positive: {}".format(size))
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -34,8 +34,10 @@ async def motor():
 
 
 @pytest_asyncio.fixture()
-async def sqlalchemy():
-    SQLALCHEMY_DATABASE_URI = "sqlite+aiosqlite:///./tests/testing.db"
+async def sqlalchemy(tmp_path):
+    SQLALCHEMY_DATABASE_URI = "sqlite+aiosqlite:///{}".format(
+        tmp_path / "testing.db"
+    )
 
     engine = create_async_engine(
         SQLALCHEMY_DATABASE_URI, future=True, echo=True
@@ -21,3 +21,13 @@ class SongCreate(SongBase):
 
 class SongUpdate(SongBase):
     pass
+
+
+class SongRead(SongBase):
+    id: UUID
+
+
+class Genre(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(sa_column_kwargs={"unique": True})
+    description: Optional[str] = None
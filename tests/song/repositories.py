@@ -1,8 +1,14 @@
 from service_repository.repositories.sqlalchemy import BaseRepositorySqlalchemy
-from tests.song.models import Song
+from tests.song.models import Genre, Song
 
 
 class SongRepository(BaseRepositorySqlalchemy):
     """Class representing the song repository."""
 
     model = Song
+
+
+class GenreRepository(BaseRepositorySqlalchemy):
+    """Class representing the genre repository."""
+
+    model = Genre
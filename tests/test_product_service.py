@@ -1,6 +1,19 @@
-import pytest
+import asyncio
+import logging
 
-from tests.product.models import ProductCreate, ProductUpdate
+import pytest
+from bson import ObjectId
+
+from service_repository.cache import MemoryCache
+from service_repository.filters.mongo import (
+    apply_mongo_filters,
+    apply_mongo_sort,
+)
+from service_repository.instrumentation import MemoryInstrument
+from service_repository.single_flight import SingleFlight
+from service_repository.unit_of_work import UnitOfWork
+from tests.product.models import Product, ProductCreate, ProductUpdate
+from tests.product.repositories import ProductRepository
 from tests.product.services import ProductService
 
 
@@ -173,6 +186,28 @@ async def test_product_service_with_sort_desc_paginate_product(
     assert pagination["items"][0].title == "Product title 4"
 
 
+@pytest.mark.asyncio
+async def test_product_service_update_where_product(
+    app, motor, product_data_one
+):
+    for item in range(3):
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(
+                **dict(product_data_one, title=f"P {item}")
+            )
+        )
+
+    updated = await ProductService(db=motor).update_where(
+        values={"is_active": False},
+        criteria=[{"field": "title", "op": "!=", "value": "P 1"}],
+        returning=True,
+    )
+
+    assert updated["total"] == 2
+    assert len(updated["keys"]) == 2
+    assert await ProductService(db=motor).count(is_active=False) == 2
+
+
 @pytest.mark.asyncio
 async def test_product_service_delete_product(app, motor, product_one):
     await ProductService(db=motor).delete(_id=product_one.id)
@@ -180,6 +215,75 @@ async def test_product_service_delete_product(app, motor, product_one):
     assert product is None
 
 
+@pytest.mark.asyncio
+async def test_product_service_delete_product_criteria_returning(
+    app, motor, product_data_one
+):
+    for item in range(4):
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(
+                **dict(product_data_one, title=f"P {item}")
+            )
+        )
+
+    deleted = await ProductService(db=motor).delete(
+        criteria=[{"field": "title", "op": "in", "value": ["P 0", "P 2"]}],
+        returning=True,
+    )
+    one = await ProductService(db=motor).delete(title="P 1")
+
+    assert deleted["total"] == 2
+    assert len(deleted["keys"]) == 2
+    assert one == {"total": 1, "keys": None}
+    assert await ProductService(db=motor).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_product_service_delete_all_matching_kwargs(
+    app, motor, product_data_one
+):
+    for item in range(3):
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**dict(product_data_one, is_active=False))
+        )
+    await ProductService(db=motor).create(
+        schema_in=ProductCreate(**dict(product_data_one, is_active=True))
+    )
+
+    deleted = await ProductService(db=motor).delete(is_active=False)
+
+    assert deleted == {"total": 3, "keys": None}
+    assert await ProductService(db=motor).count() == 1
+    with pytest.raises(ValueError):
+        await ProductService(db=motor).delete()
+
+
+@pytest.mark.asyncio
+async def test_product_service_criteria_count_all_exists_product(
+    app, motor, product_data_one
+):
+    for item in range(5):
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(
+                **dict(product_data_one, title=f"P {item}")
+            )
+        )
+
+    criteria = [{"field": "title", "op": "in", "value": ["P 1", "P 3"]}]
+    service = ProductService(db=motor)
+    products = await service.all(
+        criteria=[{"field": "title", "op": ">=", "value": "P 2"}],
+        sort=[{"field": "title", "direction": "desc"}],
+        limit=2,
+    )
+
+    assert await service.count(criteria=criteria) == 2
+    assert [product["title"] for product in products] == ["P 4", "P 3"]
+    assert (await service.get(criteria=criteria, title="P 3")).title == "P 3"
+    assert await service.exists(criteria=criteria) is True
+    assert await service.exists(title="P 9") is False
+
+
 @pytest.mark.asyncio
 async def test_product_service_count_product(app, motor, product_data_one):
     count = 10
@@ -197,3 +301,470 @@ async def test_product_service_count_product(app, motor, product_data_one):
     total = await ProductService(db=motor).count()
 
     assert total == count
+
+
+@pytest.mark.asyncio
+async def test_product_service_paginate_product_second_page(
+    app, motor, product_data_one
+):
+    count = 12
+    sort = [("title", 1)]
+    for item in range(count):
+        product_data_one.update({"title": f"Product title {item:02d}"})
+
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**product_data_one)
+        )
+
+    for mode in ("offset", "facet"):
+        pagination = await ProductService(db=motor).paginate(
+            page=3, per_page=5, sort=sort, mode=mode
+        )
+
+        assert [item.title for item in pagination["items"]] == [
+            "Product title 10",
+            "Product title 11",
+        ]
+        assert pagination["num_pages"] == 3
+        assert pagination["page"] == 3
+        assert pagination["total"] == count
+
+
+@pytest.mark.asyncio
+async def test_product_service_keyset_paginate_product(
+    app, motor, product_data_one
+):
+    count = 12
+    sort = [("title", -1)]
+    for item in range(count):
+        product_data_one.update({"title": f"Product title {item:02d}"})
+
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**product_data_one)
+        )
+
+    titles = []
+    cursor = None
+    for page in range(3):
+        pagination = await ProductService(db=motor).paginate(
+            per_page=5, sort=sort, mode="keyset", cursor=cursor
+        )
+        titles.extend(item.title for item in pagination["items"])
+        cursor = pagination["next_cursor"]
+
+    assert cursor is None
+    assert titles == [
+        f"Product title {item:02d}" for item in reversed(range(count))
+    ]
+
+    pagination = await ProductService(db=motor).paginate(
+        per_page=5,
+        sort=sort,
+        mode="keyset",
+        cursor=pagination["prev_cursor"],
+    )
+
+    assert [item.title for item in pagination["items"]] == titles[5:10]
+
+
+@pytest.mark.asyncio
+async def test_product_service_paginate_product_without_count(
+    app, motor, product_data_one
+):
+    count = 7
+    for item in range(count):
+        product_data_one.update({"title": f"Product title {item}"})
+
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**product_data_one)
+        )
+
+    first = await ProductService(db=motor).paginate(
+        page=1, per_page=5, count_mode="none"
+    )
+    second = await ProductService(db=motor).paginate(
+        page=2, per_page=5, count_mode="none"
+    )
+    estimated = await ProductService(db=motor).paginate(
+        page=1, per_page=5, count_mode="estimated"
+    )
+
+    assert len(first["items"]) == 5
+    assert first["has_next"] is True
+    assert first["total"] is None
+    assert len(second["items"]) == 2
+    assert second["has_next"] is False
+    assert estimated["total"] == count
+
+
+@pytest.mark.asyncio
+async def test_product_service_bulk_create_update_delete_product(
+    app, motor, product_data_one
+):
+    schemas_in = [
+        ProductCreate(**dict(product_data_one, title=f"Product title {item}"))
+        for item in range(7)
+    ]
+
+    created = await ProductService(db=motor).bulk_create(
+        schemas_in=schemas_in, batch_size=3
+    )
+    updated = await ProductService(db=motor).bulk_update(
+        items=[
+            (product, ProductUpdate(is_active=False))
+            for product in created["items"][:4]
+        ],
+        batch_size=3,
+    )
+    deleted = await ProductService(db=motor).bulk_delete(
+        criteria={"is_active": False}
+    )
+    total = await ProductService(db=motor).count()
+
+    assert created["batches"] == [3, 3, 1]
+    assert all(product.id is not None for product in created["items"])
+    assert updated["batches"] == [3, 1]
+    assert deleted["total"] == 4
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_product_service_upsert_many_product(
+    app, motor, product_one, monkeypatch
+):
+    schemas_in = [
+        Product(_id=product_one.id, title="Product title updated"),
+        Product(title="Product title new"),
+        Product(title="Product title other"),
+    ]
+
+    service = ProductService(db=motor)
+    collection = (await service.get_repository()).get_collection()
+    bulk_write = collection.bulk_write
+    filters = []
+
+    async def spy(requests, **kwargs):
+        filters.extend(
+            getattr(request, "_filter", None) for request in requests
+        )
+        return await bulk_write(requests, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", spy)
+
+    result = await service.upsert_many(schemas_in=schemas_in)
+    product = await ProductService(db=motor).get(_id=product_one.id)
+    titles = {
+        document["title"] for document in await ProductService(db=motor).all()
+    }
+
+    # The new documents are inserted, not upserted on {"_id": None}.
+    assert filters == [{"_id": product_one.id}, None, None]
+    assert result["total"] == 3
+    assert product.title == "Product title updated"
+    assert titles == {
+        "Product title updated",
+        "Product title new",
+        "Product title other",
+    }
+
+
+@pytest.mark.asyncio
+async def test_product_service_stream_products(app, motor, product_data_one):
+    count = 7
+    for item in range(count):
+        product_data_one.update({"title": f"Product title {item}"})
+
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**product_data_one)
+        )
+
+    products = [
+        product
+        async for product in ProductService(db=motor).stream(
+            sort=[("title", -1)], chunk_size=3
+        )
+    ]
+    documents = [
+        document
+        async for document in ProductService(db=motor).stream(raw=True)
+    ]
+
+    assert [product.title for product in products] == [
+        f"Product title {item}" for item in reversed(range(count))
+    ]
+    assert "_id" in documents[0]
+
+
+@pytest.mark.asyncio
+async def test_product_repository_create_product_read_back(
+    app, motor, product_data_one
+):
+    product = await ProductRepository(db=motor).create(
+        schema_in=product_data_one
+    )
+    product_read_back = await ProductRepository(db=motor).create(
+        schema_in=product_data_one, read_back=True
+    )
+    stored = await ProductService(db=motor).get(_id=product.id)
+
+    assert stored == product
+    assert product_read_back.id != product.id
+    assert product_read_back.title == product.title
+
+
+@pytest.mark.asyncio
+async def test_product_service_filter_and_sort_spec_paginate_product(
+    app, motor, product_data_one
+):
+    for item in range(5):
+        product_data_one.update({"title": f"Product title {item}"})
+        await ProductService(db=motor).create(
+            schema_in=ProductCreate(**product_data_one)
+        )
+
+    criteria = {
+        "or": [
+            {"field": "title", "op": "ilike", "value": "product title 1"},
+            {"field": "title", "op": "in", "value": ["Product title 3"]},
+        ]
+    }
+    sort = [{"field": "title", "direction": "desc"}]
+
+    pagination = await ProductService(db=motor).paginate(
+        page=1, per_page=5, criteria=criteria, sort=sort
+    )
+
+    assert [item.title for item in pagination["items"]] == [
+        "Product title 3",
+        "Product title 1",
+    ]
+    assert pagination["total"] == 2
+
+
+def test_product_filter_spec_to_mongo_query():
+    criteria = [
+        {"field": "id", "op": "is_not_null"},
+        {"not": [{"field": "title", "op": "like", "value": "A_%"}]},
+    ]
+
+    assert apply_mongo_filters(criteria, Product) == {
+        "$and": [
+            {"_id": {"$exists": True, "$ne": None}},
+            {"$nor": [{"title": {"$regex": "^A..*$"}}]},
+        ]
+    }
+    assert apply_mongo_sort({"field": "id", "direction": "desc"}, Product) == [
+        ("_id", -1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_product_service_cached_count_per_database(
+    app, motor, product_one
+):
+    other = motor.client.get_database("testing_other")
+    await other.drop_collection("product")
+
+    one = await ProductService(db=motor).paginate(count_mode="cached")
+    empty = await ProductService(db=other).paginate(count_mode="cached")
+
+    assert one["total"] == 1
+    assert empty["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_product_repository_warns_unindexed_filter(
+    app, motor, product_one, caplog
+):
+    class IndexedProductRepository(ProductRepository):
+        index_cache = MemoryCache()
+
+    await motor.get_collection("product").create_index("title")
+    repository = IndexedProductRepository(db=motor)
+
+    with caplog.at_level(logging.WARNING):
+        await repository.paginate(criteria={"title": "Product title 1"})
+        await repository.paginate(criteria={"is_active": True})
+        await repository.paginate(criteria={"is_active": False})
+
+    messages = [
+        record.getMessage()
+        for record in caplog.records
+        if record.name == "service_repository.repositories.motor"
+    ]
+    assert messages == [
+        "No index starts with a field of the query on `is_active`. "
+        "Collection `product`."
+    ]
+
+
+@pytest.mark.asyncio
+async def test_product_service_paginate_and_get_product_fields(
+    app, motor, product_one
+):
+    for mode in ("offset", "facet", "keyset"):
+        pagination = await ProductService(db=motor).paginate(
+            fields=["title"], mode=mode
+        )
+        (product,) = pagination["items"]
+        assert product.id == product_one.id
+        assert product.title == product_one.title
+        assert "is_active" not in product.__fields_set__
+
+    product = await ProductService(db=motor).get(
+        fields=["title"], _id=product_one.id
+    )
+    assert "is_active" not in product.__fields_set__
+
+
+@pytest.mark.asyncio
+async def test_product_service_paginate_product_result_modes(
+    app, motor, product_one
+):
+    service = ProductService(db=motor)
+
+    pagination = await service.paginate(result_mode="dict")
+    (document,) = pagination["items"]
+    assert document["_id"] == product_one.id
+
+    pagination = await service.paginate(result_mode="columns", mode="keyset")
+    (row,) = pagination["items"]
+    assert row.id == product_one.id
+    assert row.title == product_one.title
+
+    product = await service.get(result_mode="construct", _id=product_one.id)
+    assert product.dict() == product_one.dict()
+
+
+@pytest.mark.asyncio
+async def test_product_service_caches_collection_handle(
+    app, motor, product_one
+):
+    service = ProductService(db=motor)
+    repository = await service.get_repository()
+    collection = repository.get_collection()
+
+    await service.get(_id=product_one.id)
+    assert repository.get_collection() is collection
+
+    await service.close()
+    assert repository._collection_handle is None
+
+
+class StubSession(object):
+    def __init__(self):
+        self.calls = []
+
+    def start_transaction(self):
+        self.calls.append("start")
+
+    async def commit_transaction(self):
+        self.calls.append("commit")
+
+    async def abort_transaction(self):
+        self.calls.append("abort")
+
+    async def end_session(self):
+        self.calls.append("end")
+
+
+class StubClient(object):
+    def __init__(self):
+        self.session = StubSession()
+
+    async def start_session(self):
+        return self.session
+
+
+class StubDatabase(object):
+    """Like a Motor database, any missing attribute is a collection."""
+
+    def __init__(self):
+        self.client = StubClient()
+
+    def __getattr__(self, name):
+        return "collection {}".format(name)
+
+
+@pytest.mark.asyncio
+async def test_product_unit_of_work_starts_session_on_motor_database():
+    db = StubDatabase()
+
+    async with UnitOfWork(db) as unit:
+        assert unit.session is db.client.session
+
+    assert db.client.session.calls == ["start", "commit", "end"]
+
+
+@pytest.mark.asyncio
+async def test_product_service_instrument_spans(app, motor, product_one):
+    instrument = MemoryInstrument()
+
+    class InstrumentedProductService(ProductService):
+        pass
+
+    InstrumentedProductService.instrument = instrument
+    service = InstrumentedProductService(db=motor)
+    await service.paginate(page=1, per_page=10)
+    await service.get(_id=product_one.id)
+    await service.all()
+
+    paginate = instrument.get("InstrumentedProductService", "paginate")
+    get = instrument.get("InstrumentedProductService", "get")
+    all_ = instrument.get("InstrumentedProductService", "all")
+
+    assert paginate["statements"] == 2
+    assert paginate["rows"] == 1
+    assert 0 < paginate["db_time"] <= paginate["wall_time"]
+    assert (get["statements"], get["rows"]) == (1, 1)
+    assert (all_["statements"], all_["rows"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_product_service_get_many(app, motor, product_data_one):
+    products = (
+        await ProductService(db=motor).bulk_create(
+            schemas_in=[
+                ProductCreate(**dict(product_data_one, title=f"P {item}"))
+                for item in range(3)
+            ]
+        )
+    )["items"]
+
+    keys = [products[2].id, ObjectId(), products[0].id]
+    got = await ProductService(db=motor).get_many(keys)
+    async with ProductService(db=motor).loader():
+        loaded = await asyncio.gather(
+            *[ProductService(db=motor).get(_id=key) for key in keys]
+        )
+
+    assert [product and product.id for product in got] == [
+        products[2].id,
+        None,
+        products[0].id,
+    ]
+    assert [product and product.title for product in loaded] == [
+        "P 2",
+        None,
+        "P 0",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_product_service_single_flight(app, motor, product_one):
+    class SharedProductService(ProductService):
+        single_flight = SingleFlight()
+        read_your_writes = 0
+
+    service = SharedProductService(db=motor)
+    pages = await asyncio.gather(
+        *[service.paginate(page=1, per_page=10) for _ in range(3)]
+    )
+    await service.update(
+        instance=product_one, schema_in=ProductUpdate(title="Renamed")
+    )
+    page = await service.paginate(page=1, per_page=10)
+
+    assert pages[0] is pages[1] is pages[2]
+    assert SharedProductService.single_flight.shared == 2
+    assert page["items"][0].title == "Renamed"
@@ -1,6 +1,25 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+from uuid import uuid4
+
 import pytest
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlmodel import SQLModel
 
-from tests.song.models import SongCreate, SongUpdate
+from service_repository.cache import MemoryCache
+from service_repository.filters.filters import compile_filters
+from service_repository.filters.models import clear_model_meta, get_model_meta
+from service_repository.filters.pagination import _estimate
+from service_repository.instrumentation import (
+    MemoryInstrument,
+    PrometheusInstrument,
+)
+from service_repository.single_flight import SingleFlight
+from tests.song.models import Song, SongCreate, SongRead, SongUpdate
+from tests.song.repositories import GenreRepository, SongRepository
 from tests.song.services import SongService
 
 
@@ -243,6 +262,37 @@ async def test_song_service_get_all_songs_with_filter(
     assert len(songs) == 1
 
 
+@pytest.mark.asyncio
+async def test_song_service_update_where_song(app, sqlalchemy, song_data_one):
+    async with sqlalchemy() as session:
+        songs = (
+            await SongService(db=session).bulk_create(
+                schemas_in=[
+                    SongCreate(**dict(song_data_one, title=f"Song {item}"))
+                    for item in range(3)
+                ]
+            )
+        )["items"]
+
+    async with sqlalchemy() as session:
+        updated = await SongService(db=session).update_where(
+            values={"is_active": False},
+            criteria=[{"field": "title", "op": "!=", "value": "Song 1"}],
+            returning=True,
+        )
+        renamed = await SongService(db=session).update_where(
+            values={"title": "Song renamed"}, id=songs[1].id
+        )
+        inactive = await SongService(db=session).count(is_active=False)
+        song = await SongService(db=session).get(id=songs[1].id)
+
+    assert updated["total"] == 2
+    assert sorted(updated["keys"]) == sorted([(songs[0].id,), (songs[2].id,)])
+    assert renamed == {"total": 1, "keys": None}
+    assert inactive == 2
+    assert song.title == "Song renamed"
+
+
 @pytest.mark.asyncio
 async def test_song_service_delete_song(app, sqlalchemy, song_one):
     async with sqlalchemy() as session:
@@ -252,6 +302,72 @@ async def test_song_service_delete_song(app, sqlalchemy, song_one):
     assert song is None
 
 
+@pytest.mark.asyncio
+async def test_song_service_delete_song_criteria_returning(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session:
+        songs = (
+            await SongService(db=session).bulk_create(
+                schemas_in=[
+                    SongCreate(**dict(song_data_one, title=f"Song {item}"))
+                    for item in range(4)
+                ]
+            )
+        )["items"]
+
+    async with sqlalchemy() as session:
+        deleted = await SongService(db=session).delete(
+            criteria=[
+                {"field": "title", "op": "in", "value": ["Song 0", "Song 2"]}
+            ],
+            returning=True,
+        )
+        missing = await SongService(db=session).delete(title="Song 0")
+        total = await SongService(db=session).count()
+
+    assert deleted["total"] == 2
+    assert sorted(deleted["keys"]) == sorted([(songs[0].id,), (songs[2].id,)])
+    assert missing == {"total": 0, "keys": None}
+    assert total == 2
+
+    async with sqlalchemy() as session:
+        with pytest.raises(ValueError):
+            await SongService(db=session).delete()
+
+
+@pytest.mark.asyncio
+async def test_song_service_criteria_count_all_exists_song(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session:
+        await SongService(db=session).bulk_create(
+            schemas_in=[
+                SongCreate(**dict(song_data_one, title=f"Song {item}"))
+                for item in range(5)
+            ]
+        )
+
+    criteria = [{"field": "title", "op": "in", "value": ["Song 1", "Song 3"]}]
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        total = await service.count(criteria=criteria)
+        songs = await service.all(
+            criteria=[{"field": "title", "op": ">=", "value": "Song 2"}],
+            sort=[{"field": "title", "direction": "desc"}],
+            limit=2,
+        )
+        song = await service.get(criteria=criteria, title="Song 3")
+        exists = await service.exists(criteria=criteria)
+        missing = await service.exists(title="Song 9")
+
+    assert total == 2
+    assert [song.title for song in songs] == ["Song 4", "Song 3"]
+    assert song.title == "Song 3"
+    assert exists is True
+    assert missing is False
+
+
 @pytest.mark.asyncio
 async def test_song_service_count_song(app, sqlalchemy, song_data_one):
     count = 5
@@ -271,3 +387,888 @@ async def test_song_service_count_song(app, sqlalchemy, song_data_one):
         total = await SongService(db=session).count()
 
     assert total == count
+
+
+@pytest.mark.asyncio
+async def test_song_service_keyset_paginate_song(
+    app, sqlalchemy, song_data_one
+):
+    count = 12
+    sort = [{"field": "title", "direction": "asc"}]
+
+    async with sqlalchemy() as session:
+        for item in range(count):
+            song_data_one.update({"title": f"Song title {item:02d}"})
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    titles = []
+    cursor = None
+    async with sqlalchemy() as session:
+        for page in range(3):
+            pagination = await SongService(db=session).paginate(
+                per_page=5, sort=sort, mode="keyset", cursor=cursor
+            )
+            titles.extend(item.title for item in pagination["items"])
+            cursor = pagination["next_cursor"]
+
+        assert cursor is None
+        assert len(pagination["items"]) == 2
+
+        pagination = await SongService(db=session).paginate(
+            per_page=5,
+            sort=sort,
+            mode="keyset",
+            cursor=pagination["prev_cursor"],
+        )
+
+    assert titles == [f"Song title {item:02d}" for item in range(count)]
+    assert [item.title for item in pagination["items"]] == titles[5:10]
+    assert pagination["prev_cursor"] is not None
+    assert pagination["next_cursor"] is not None
+
+
+@pytest.mark.asyncio
+async def test_song_service_keyset_paginate_song_mixed_sort(
+    app, sqlalchemy, song_data_one
+):
+    sort = [
+        {"field": "is_active", "direction": "desc"},
+        {"field": "title", "direction": "asc"},
+    ]
+
+    async with sqlalchemy() as session:
+        for item in range(6):
+            song_data_one.update(
+                {"title": f"Song title {item}", "is_active": item % 2 == 0}
+            )
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    async with sqlalchemy() as session:
+        first = await SongService(db=session).paginate(
+            per_page=4, sort=sort, mode="keyset"
+        )
+        second = await SongService(db=session).paginate(
+            per_page=4, sort=sort, mode="keyset", cursor=first["next_cursor"]
+        )
+
+    titles = [item.title for item in first["items"] + second["items"]]
+    assert titles == [f"Song title {item}" for item in (0, 2, 4, 1, 3, 5)]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_song_without_count(
+    app, sqlalchemy, song_data_one
+):
+    count = 7
+    async with sqlalchemy() as session:
+        for item in range(count):
+            song_data_one.update({"title": f"Song title {item}"})
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    async with sqlalchemy() as session:
+        first = await SongService(db=session).paginate(
+            page=1, per_page=5, count_mode="none"
+        )
+        second = await SongService(db=session).paginate(
+            page=2, per_page=5, count_mode="none"
+        )
+
+    assert len(first["items"]) == 5
+    assert first["has_next"] is True
+    assert first["total"] is None
+    assert first["num_pages"] is None
+    assert len(second["items"]) == 2
+    assert second["has_next"] is False
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_song_with_cached_count(
+    app, sqlalchemy, song_data_one
+):
+    await SongRepository.count_cache.clear()
+    async with sqlalchemy() as session:
+        for item in range(3):
+            song_data_one.update({"title": f"Song title {item}"})
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+        pagination = await SongService(db=session).paginate(
+            page=1, per_page=5, count_mode="cached"
+        )
+        assert pagination["total"] == 3
+
+        await SongService(db=session).create(
+            schema_in=SongCreate(**song_data_one)
+        )
+        pagination = await SongService(db=session).paginate(
+            page=1, per_page=5, count_mode="cached"
+        )
+        assert pagination["total"] == 3
+
+        pagination = await SongService(db=session).paginate(
+            page=1, per_page=5, count_mode="estimated"
+        )
+        assert pagination["total"] == 4
+    await SongRepository.count_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_song_service_cached_count_per_database(
+    app, sqlalchemy, song_one, tmp_path
+):
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///{}".format(tmp_path / "other.db")
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    async with sqlalchemy() as session:
+        one = await SongService(db=session).paginate(count_mode="cached")
+    async with AsyncSession(bind=engine) as session:
+        other = await SongService(db=session).paginate(count_mode="cached")
+    await engine.dispose()
+
+    assert one["total"] == 1
+    assert other["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_song_repository_estimate_keeps_colons_in_values():
+    class Connection(object):
+        async def exec_driver_sql(self, sql):
+            self.sql = sql
+            return SimpleNamespace(
+                scalar_one=lambda: [{"Plan": {"Plan Rows": 7}}]
+            )
+
+    connection = Connection()
+
+    async def get_connection():
+        return connection
+
+    session = SimpleNamespace(
+        bind=SimpleNamespace(dialect=postgresql.dialect()),
+        connection=get_connection,
+    )
+    stmt = select(Song).where(Song.title == "at 10:30")
+
+    assert await _estimate(stmt, session, Song) == 7
+    assert connection.sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "'at 10:30'" in connection.sql
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_song_with_concurrent_count(
+    app, sqlalchemy, song_data_one, monkeypatch
+):
+    monkeypatch.setattr(SongRepository, "concurrent_count", True)
+    count = 7
+    async with sqlalchemy() as session:
+        for item in range(count):
+            song_data_one.update({"title": f"Song title {item}"})
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    async with sqlalchemy() as session:
+        pagination = await SongService(db=session).paginate(page=2, per_page=5)
+
+    assert len(pagination["items"]) == 2
+    assert pagination["num_pages"] == 2
+    assert pagination["total"] == count
+    assert pagination["has_next"] is False
+
+
+@pytest.mark.asyncio
+async def test_song_service_concurrent_count_in_unit_of_work(
+    app, sqlalchemy, song_one, song_data_one, monkeypatch
+):
+    monkeypatch.setattr(SongRepository, "concurrent_count", True)
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        async with service.unit_of_work():
+            for item in range(3):
+                await service.create(
+                    schema_in=SongCreate(
+                        **dict(song_data_one, title=f"Song title {item}")
+                    )
+                )
+            pagination = await service.paginate(page=1, per_page=5)
+
+    assert len(pagination["items"]) == 4
+    assert pagination["total"] == 4
+
+
+@pytest.mark.asyncio
+async def test_song_service_bulk_create_update_delete_song(
+    app, sqlalchemy, song_data_one
+):
+    schemas_in = [
+        SongCreate(**dict(song_data_one, title=f"Song title {item}"))
+        for item in range(7)
+    ]
+
+    async with sqlalchemy() as session:
+        created = await SongService(db=session).bulk_create(
+            schemas_in=schemas_in, batch_size=3
+        )
+        updated = await SongService(db=session).bulk_update(
+            items=[
+                (song, SongUpdate(is_active=False))
+                for song in created["items"][:4]
+            ],
+            batch_size=3,
+        )
+        deleted = await SongService(db=session).bulk_delete(
+            criteria=[{"field": "is_active", "op": "==", "value": False}]
+        )
+        total = await SongService(db=session).count()
+
+    assert created["batches"] == [3, 3, 1]
+    assert created["total"] == 7
+    assert all(song.id is not None for song in created["items"])
+    assert updated["batches"] == [3, 1]
+    assert created["items"][0].is_active is False
+    assert deleted["total"] == 4
+    assert total == 3
+
+
+@pytest.mark.asyncio
+async def test_song_service_upsert_many_song(app, sqlalchemy, song_one):
+    schemas_in = [
+        Song(id=song_one.id, title="Song title updated", is_active=False),
+        Song(title="Song title new", is_active=True),
+    ]
+
+    async with sqlalchemy() as session:
+        result = await SongService(db=session).upsert_many(
+            schemas_in=schemas_in
+        )
+        song = await SongService(db=session).get(id=song_one.id)
+        total = await SongService(db=session).count()
+
+    assert result["total"] == 2
+    assert song.title == "Song title updated"
+    assert total == 2
+
+
+@pytest.mark.asyncio
+async def test_genre_repository_upsert_many_keeps_primary_key(app, sqlalchemy):
+    async with sqlalchemy() as session:
+        repository = GenreRepository(db=session)
+        await repository.upsert_many(
+            schemas_in=[{"name": "rock"}, {"name": "jazz"}], keys=["name"]
+        )
+        rock_id = (await repository.get(name="rock")).id
+        await repository.upsert_many(
+            schemas_in=[
+                {"name": "rock", "description": "Loud"},
+                {"name": "blues"},
+            ],
+            keys=["name"],
+        )
+        session.expire_all()
+        genres = {genre.name: genre for genre in await repository.all()}
+
+    assert rock_id is not None
+    assert genres["rock"].id == rock_id
+    assert genres["rock"].description == "Loud"
+    assert len({genre.id for genre in genres.values()}) == 3
+
+
+@pytest.mark.asyncio
+async def test_song_service_stream_songs(app, sqlalchemy, song_data_one):
+    count = 7
+    criteria = [{"field": "is_active", "op": "==", "value": True}]
+    sort = [{"field": "title", "direction": "desc"}]
+
+    async with sqlalchemy() as session:
+        for item in range(count):
+            song_data_one.update({"title": f"Song title {item}"})
+
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    async with sqlalchemy() as session:
+        songs = [
+            song
+            async for song in SongService(db=session).stream(
+                criteria=criteria, sort=sort, chunk_size=3
+            )
+        ]
+        rows = [
+            row
+            async for row in SongService(db=session).stream(
+                chunk_size=3, raw=True
+            )
+        ]
+
+    assert [song.title for song in songs] == [
+        f"Song title {item}" for item in reversed(range(count))
+    ]
+    assert len(rows) == count
+    assert set(rows[0].keys()) == {"id", "title", "is_active"}
+
+
+@pytest.mark.asyncio
+async def test_song_service_lazy_logging(
+    app, sqlalchemy, song_data_one, caplog, monkeypatch
+):
+    caplog.set_level(logging.INFO, logger="service_repository.services")
+
+    async with sqlalchemy() as session:
+        song = await SongService(db=session).create(
+            schema_in=SongCreate(**song_data_one)
+        )
+
+    (record,) = [r for r in caplog.records if "created" in r.getMessage()]
+    assert record.service == "SongService"
+    assert not hasattr(record, "schema_out")
+
+    caplog.clear()
+    monkeypatch.setattr(SongService, "log_payloads", True)
+    async with sqlalchemy() as session:
+        await SongService(db=session).get(id=song.id)
+
+    (record,) = [r for r in caplog.records if "got" in r.getMessage()]
+    assert record.schema_out["title"] == song_data_one["title"]
+
+    caplog.clear()
+    monkeypatch.setattr(SongService, "log_sample_rate", 0)
+    async with sqlalchemy() as session:
+        await SongService(db=session).get(id=song.id)
+
+    assert not [r for r in caplog.records if r.name == record.name]
+
+
+@pytest.mark.asyncio
+async def test_song_service_read_through_cache(
+    app, sqlalchemy, song_one, song_data_two
+):
+    class CachedSongService(SongService):
+        cache = MemoryCache(maxsize=2)
+
+    async with sqlalchemy() as session:
+        service = CachedSongService(db=session)
+        first = await service.get(id=song_one.id)
+        second = await service.get(id=song_one.id)
+        total = await service.count()
+
+        await service.create(schema_in=SongCreate(**song_data_two))
+        total_after_create = await service.count()
+
+    assert first is second
+    assert total == 1
+    assert total_after_create == 2
+    assert CachedSongService.cache.metrics == {
+        "hits": 1,
+        "misses": 3,
+        "evictions": 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_song_service_updates_cached_song(app, sqlalchemy, song_one):
+    class CachedSongService(SongService):
+        cache = MemoryCache(maxsize=10)
+
+    async with sqlalchemy() as session:
+        cached = await CachedSongService(db=session).get(id=song_one.id)
+
+    async with sqlalchemy() as session:
+        service = CachedSongService(db=session)
+        song = await service.get(id=song_one.id)
+        song = await service.update(
+            instance=song, schema_in=SongUpdate(title="Song title changed")
+        )
+
+    async with sqlalchemy() as session:
+        stored = await SongService(db=session).get(id=song_one.id)
+
+    assert CachedSongService.cache.metrics["hits"] == 1
+    assert song.title == "Song title changed"
+    assert stored.title == "Song title changed"
+    assert cached.title == song_one.title
+
+
+@pytest.mark.asyncio
+async def test_song_service_cached_song_survives_expire_on_commit(
+    app, sqlalchemy, song_one, song_data_two
+):
+    class CachedSongService(SongService):
+        cache = MemoryCache(maxsize=10)
+
+    async with sqlalchemy(expire_on_commit=True) as session:
+        first = await CachedSongService(db=session).get(id=song_one.id)
+        await SongService(db=session).create(
+            schema_in=SongCreate(**song_data_two)
+        )
+
+    async with sqlalchemy() as session:
+        service = CachedSongService(db=session)
+        song = await service.get(id=song_one.id)
+        again = await service.get(id=song_one.id)
+        assert song in session
+
+    assert CachedSongService.cache.metrics["hits"] == 2
+    assert song is not first
+    assert song is again
+    assert song.title == song_one.title
+
+
+@pytest.mark.asyncio
+async def test_song_service_reuses_compiled_filters(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session:
+        for item in range(3):
+            song_data_one.update({"title": f"Song title {item}"})
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_one)
+            )
+
+    def criteria(title):
+        return [{"field": "title", "op": "==", "value": title}]
+
+    query = select(Song)
+    assert compile_filters(query, criteria("a")) is compile_filters(
+        query, criteria("b")
+    )
+
+    async with sqlalchemy() as session:
+        first = await SongService(db=session).paginate(
+            criteria=criteria("Song title 1")
+        )
+        second = await SongService(db=session).paginate(
+            criteria=criteria("Song title 2")
+        )
+
+    assert [song.title for song in first["items"]] == ["Song title 1"]
+    assert [song.title for song in second["items"]] == ["Song title 2"]
+
+
+def test_song_model_meta():
+    meta = get_model_meta(Song)
+
+    assert get_model_meta(Song) is meta
+    assert meta.primary_key_fields == (Song.id,)
+    assert {"id", "title", "is_active"} <= meta.field_names
+
+    clear_model_meta(Song)
+    assert get_model_meta(Song) is not meta
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_and_get_song_fields(
+    app, sqlalchemy, song_one
+):
+    async with sqlalchemy() as session:
+        pagination = await SongService(db=session).paginate(
+            fields=["title"], sort=[{"field": "is_active", "direction": "asc"}]
+        )
+        (song,) = pagination["items"]
+        assert song.title == song_one.title
+        assert inspect(song).unloaded == set()
+
+    async with sqlalchemy() as session:
+        song = await SongService(db=session).get(
+            fields=["title"], id=song_one.id
+        )
+        assert song.id == song_one.id
+        assert inspect(song).unloaded == {"is_active"}
+
+        rows = [
+            row
+            async for row in SongService(db=session).stream(
+                fields=["title"], raw=True
+            )
+        ]
+        assert [dict(row) for row in rows] == [{"title": song_one.title}]
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_fields_sorted_by_a_field(
+    app, sqlalchemy, song_one
+):
+    sort = [{"field": "title", "direction": "asc"}]
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        documents = await service.paginate(
+            fields=["title"], sort=sort, result_mode="dict"
+        )
+        rows = await service.paginate(
+            fields=["title", "id"], sort=sort, result_mode="columns"
+        )
+
+    (document,) = documents["items"]
+    (row,) = rows["items"]
+    assert document == {"title": song_one.title, "id": song_one.id}
+    assert row._fields == ("title", "id")
+
+
+@pytest.mark.asyncio
+async def test_song_service_paginate_song_result_modes(
+    app, sqlalchemy, song_one
+):
+    class SongReadRepository(SongRepository):
+        schema = SongRead
+
+    class SongReadService(SongService):
+        repository = SongReadRepository
+
+    expected = {
+        "id": song_one.id,
+        "title": song_one.title,
+        "is_active": song_one.is_active,
+    }
+
+    async with sqlalchemy() as session:
+        service = SongReadService(db=session)
+        pagination = await service.paginate(result_mode="dict")
+        assert pagination["items"] == [expected]
+
+        pagination = await service.paginate(result_mode="columns")
+        (row,) = pagination["items"]
+        assert row.title == song_one.title
+        assert row._asdict() == expected
+
+        pagination = await service.paginate(
+            result_mode="construct", mode="keyset"
+        )
+        (song,) = pagination["items"]
+        assert isinstance(song, SongRead)
+        assert song.dict() == expected
+
+        song = await service.get(
+            fields=["title"], result_mode="dict", id=song_one.id
+        )
+        assert song == {"title": song_one.title}
+
+        with pytest.raises(ValueError):
+            await service.paginate(result_mode="xml")
+
+
+@pytest.mark.asyncio
+async def test_song_service_reuses_bound_repository(app, sqlalchemy, song_one):
+    events = []
+
+    class TrackedSongRepository(SongRepository):
+        async def on_bind(self):
+            events.append("on_bind")
+
+        async def close(self):
+            events.append("close")
+
+    class TrackedSongService(SongService):
+        repository = TrackedSongRepository
+
+    async with sqlalchemy() as session:
+        service = TrackedSongService(db=session)
+        repository = await service.get_repository()
+        await service.get(id=song_one.id)
+        await service.count()
+        assert await service.get_repository() is repository
+
+        await service.close()
+        assert await service.get_repository() is not repository
+
+    assert events == ["on_bind", "close", "on_bind"]
+
+
+@pytest.mark.asyncio
+async def test_song_service_unit_of_work_commits_once(
+    app, sqlalchemy, song_data_one, song_data_two
+):
+    commits = []
+
+    async with sqlalchemy() as session:
+        event.listen(
+            session.sync_session, "after_commit", lambda s: commits.append(1)
+        )
+        service = SongService(db=session)
+        async with service.unit_of_work():
+            song = await service.create(schema_in=SongCreate(**song_data_one))
+            await SongService(db=session).create(
+                schema_in=SongCreate(**song_data_two)
+            )
+            await service.update(
+                instance=song, schema_in=SongUpdate(is_active=False)
+            )
+            assert await service.count() == 2
+
+    assert len(commits) == 1
+
+    async with sqlalchemy() as session:
+        song = await SongService(db=session).get(id=song.id)
+        assert song.is_active is False
+
+
+@pytest.mark.asyncio
+async def test_song_service_unit_of_work_rolls_back_on_error(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        with pytest.raises(RuntimeError):
+            async with service.unit_of_work():
+                await service.create(schema_in=SongCreate(**song_data_one))
+                raise RuntimeError()
+
+    async with sqlalchemy() as session:
+        assert await SongService(db=session).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_song_service_unit_of_work_does_not_cache_rolled_back_reads(
+    app, sqlalchemy, song_data_one
+):
+    class CachedSongService(SongService):
+        cache = MemoryCache(maxsize=10)
+
+    async with sqlalchemy() as session:
+        service = CachedSongService(db=session)
+        with pytest.raises(RuntimeError):
+            async with service.unit_of_work():
+                song = await service.create(
+                    schema_in=SongCreate(**song_data_one)
+                )
+                assert await service.get(id=song.id) is not None
+                assert await service.count() == 1
+                raise RuntimeError()
+
+    async with sqlalchemy() as session:
+        service = CachedSongService(db=session)
+        assert await service.get(id=song.id) is None
+        assert await service.count() == 0
+
+
+@pytest.mark.asyncio
+async def test_song_service_reads_do_not_commit(app, sqlalchemy, song_one):
+    commits = []
+
+    async with sqlalchemy() as session:
+        event.listen(
+            session.sync_session, "after_commit", lambda s: commits.append(1)
+        )
+        service = SongService(db=session)
+        await service.get(id=song_one.id)
+        await service.all()
+        await service.paginate()
+        await service.paginate(mode="keyset")
+
+    assert commits == []
+
+
+@pytest.mark.asyncio
+async def test_song_service_routes_reads_to_read_db(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session, sqlalchemy() as read_session:
+        service = SongService(db=session, read_db=read_session)
+        assert (await service.get_repository(read=True)).db is read_session
+
+        song = await service.create(schema_in=SongCreate(**song_data_one))
+        assert (await service.get_repository(read=True)).db is session
+        assert await service.get(id=song.id) is song
+
+        service.read_your_writes = 0
+        assert (await service.get_repository(read=True)).db is read_session
+
+        async with service.unit_of_work():
+            assert (await service.get_repository(read=True)).db is session
+
+
+@pytest.mark.asyncio
+async def test_song_service_instrument_spans(
+    app, sqlalchemy, song_one, song_data_two
+):
+    instrument = MemoryInstrument()
+
+    class InstrumentedSongService(SongService):
+        cache = MemoryCache()
+
+    InstrumentedSongService.instrument = instrument
+
+    async with sqlalchemy() as session:
+        service = InstrumentedSongService(db=session)
+        await service.paginate(page=1, per_page=10)
+        await service.get(id=song_one.id)
+        await service.get(id=song_one.id)
+        await service.delete(id=song_one.id)
+        songs = [song async for song in service.stream()]
+
+    paginate = instrument.get("InstrumentedSongService", "paginate")
+    get = instrument.get("InstrumentedSongService", "get")
+    delete = instrument.get("InstrumentedSongService", "delete")
+    stream = instrument.get("InstrumentedSongService", "stream")
+
+    assert paginate["statements"] == 2
+    assert paginate["rows"] == 1
+    assert 0 < paginate["db_time"] <= paginate["wall_time"]
+    assert get["calls"] == 2
+    assert get["statements"] == 1
+    assert (get["cache_hits"], get["cache_misses"]) == (1, 1)
+    assert delete["statements"] == 2
+    assert delete["rows"] == 1
+    assert stream["rows"] == len(songs) == 0
+
+    prometheus = PrometheusInstrument()
+    InstrumentedSongService.instrument = prometheus
+    async with sqlalchemy() as session:
+        await InstrumentedSongService(db=session).count()
+
+    metrics = prometheus.render()
+    assert (
+        'service_repository_duration_seconds_count{service="'
+        'InstrumentedSongService",operation="count"} 1'
+    ) in metrics
+    assert (
+        'service_repository_statements_total{service="'
+        'InstrumentedSongService",operation="count"} 1'
+    ) in metrics
+
+
+@pytest.mark.asyncio
+async def test_song_service_get_many_and_loader(
+    app, sqlalchemy, song_data_one
+):
+    async with sqlalchemy() as session:
+        songs = (
+            await SongService(db=session).bulk_create(
+                schemas_in=[
+                    SongCreate(**dict(song_data_one, title=f"Song {item}"))
+                    for item in range(3)
+                ]
+            )
+        )["items"]
+
+    missing = uuid4()
+    keys = [songs[2].id, missing, songs[0].id]
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        got = await service.get_many(keys)
+        rows = await service.get_many(
+            keys, fields=["title"], result_mode="dict"
+        )
+
+    assert [song and song.id for song in got] == [
+        songs[2].id,
+        None,
+        songs[0].id,
+    ]
+    assert rows[0] == {"title": "Song 2", "id": songs[2].id}
+    assert rows[1] is None
+
+    selects = []
+    async with sqlalchemy() as session:
+        event.listen(
+            session.sync_session,
+            "do_orm_execute",
+            lambda state: selects.append(state.is_select),
+        )
+        async with SongService(db=session).loader():
+            loaded = await asyncio.gather(
+                *[
+                    SongService(db=session).get(id=key)
+                    for key in keys + [songs[2].id]
+                ]
+            )
+            again = await SongService(db=session).get(id=songs[0].id)
+            titled = await SongService(db=session).get(title="Song 1")
+
+    assert [song and song.id for song in loaded] == [
+        songs[2].id,
+        None,
+        songs[0].id,
+        songs[2].id,
+    ]
+    assert again is loaded[2]
+    assert titled.id == songs[1].id
+    assert selects == [True, True]
+
+
+@pytest.mark.asyncio
+async def test_song_service_get_many_coerced_keys(app, sqlalchemy, song_one):
+    key = str(song_one.id)
+    async with sqlalchemy() as session:
+        service = SongService(db=session)
+        got = await service.get_many([key, song_one.id])
+        async with service.loader():
+            loaded = await service.get(id=key)
+
+    assert [song.id for song in got] == [song_one.id, song_one.id]
+    assert loaded.id == song_one.id
+
+
+@pytest.mark.asyncio
+async def test_song_service_single_flight(app, sqlalchemy, song_one):
+    class SharedSongService(SongService):
+        single_flight = SingleFlight()
+        read_your_writes = 0
+
+    selects = []
+    async with sqlalchemy() as session:
+        event.listen(
+            session.sync_session,
+            "do_orm_execute",
+            lambda state: selects.append(state.is_select),
+        )
+        service = SharedSongService(db=session)
+        totals = await asyncio.gather(*[service.count() for _ in range(5)])
+        await service.count()
+
+    assert totals == [1] * 5
+    assert len(selects) == 2
+    assert SharedSongService.single_flight.shared == 4
+    assert len(SharedSongService.single_flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_song_repository_reuses_statements(
+    app, sqlalchemy, song_one, song_data_two, monkeypatch
+):
+    async with sqlalchemy() as session:
+        song_two = await SongService(db=session).create(
+            schema_in=SongCreate(**song_data_two)
+        )
+
+    clear_model_meta(Song)
+    async with sqlalchemy() as session:
+        repository = SongRepository(db=session)
+        first = await repository.get(id=song_one.id)
+        second = await repository.get(id=song_two.id)
+        active = await repository.count(is_active=True)
+        nulls = await repository.count(is_active=None)
+        exists = await repository.exists(id=song_two.id)
+        statements = dict(get_model_meta(Song).statements)
+        select_reused = repository._select(None, "model") is (
+            repository._select(None, "model")
+        )
+
+        monkeypatch.setattr(repository, "cache_statements", False)
+        uncached = await repository.get(id=song_two.id)
+
+    assert (first.id, second.id, uncached.id) == (
+        song_one.id,
+        song_two.id,
+        song_two.id,
+    )
+    assert (active, nulls, exists) == (1, 0, True)
+    assert ("get", None, "model", ("id",), (False,)) in statements
+    assert ("count", ("is_active",), (True,)) in statements
+    assert select_reused
+    assert len(get_model_meta(Song).statements) == len(statements)